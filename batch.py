@@ -0,0 +1,138 @@
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from pydub import AudioSegment
+
+# efekty z final/ sa importowane plasko, tak jak robi to GUI
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'final'))
+
+from file_io import read_audio_samples, export_audio_file, save_audio_files  # noqa: E402
+from chain import EffectChain, DistortionStage, EqualizerStage, EchoStage  # noqa: E402
+from sample_format import INT24, pcm_bytes, to_float32, unpack_int24  # noqa: E402
+from resample import resample  # noqa: E402
+from metering import LoudnessMeter  # noqa: E402
+
+AUDIO_EXTENSIONS = ('.wav', '.mp3', '.ogg', '.flac')
+
+
+def build_chain(args):
+    # kolejnosc efektow taka sama jak w GUI: przester, korektor, poglos
+    chain = EffectChain()
+    if args.distortion:
+        chain.add(DistortionStage(*args.distortion))
+    if args.eq:
+        chain.add(EqualizerStage(*args.eq))
+    if args.reverb:
+        chain.add(EchoStage(*args.reverb))
+    return chain
+
+
+def find_inputs(input_dir):
+    for root, _, files in os.walk(input_dir):
+        for name in sorted(files):
+            if name.lower().endswith(AUDIO_EXTENSIONS):
+                yield os.path.join(root, name)
+
+
+def output_path(file_path, input_dir, output_dir, file_format):
+    relative = os.path.relpath(file_path, input_dir)
+    return os.path.join(output_dir, os.path.splitext(relative)[0] + '.' + file_format)
+
+
+def is_up_to_date(file_path, out_path):
+    # wynik jest aktualny, jezeli powstal po ostatniej zmianie pliku wejsciowego;
+    # wyniki sa zapisywane przez plik tymczasowy, wiec istniejacy plik jest kompletny
+    return os.path.exists(out_path) and os.path.getmtime(out_path) >= os.path.getmtime(file_path)
+
+
+def process_file(file_path, outputs, chain, sample_rate=None):
+    start = time.perf_counter()
+
+    # probki bez kopiowania; WAV mapowany prosto z pliku, mp3/ogg dekodowane
+    # tylko raz, potem mapowane z pamieci podrecznej
+    samples, source_rate, sample_width = read_audio_samples(file_path)
+    channels = samples.shape[1]
+    if samples.dtype == INT24:
+        samples = unpack_int24(samples)
+
+    # wspolna czestotliwosc probkowania dla calej partii, efekty licza juz na docelowej
+    rate = sample_rate or source_rate
+    if rate != source_rate:
+        samples = resample(to_float32(samples), source_rate, rate)
+    processed = chain.render(samples, rate)
+
+    # poziomy wyniku mierzone jednym przejsciem, zanim trafi do koderow
+    meter = LoudnessMeter(rate, channels)
+    meter.process(processed)
+
+    # wynik ma ta sama rozdzielczosc co wejscie (8-bitowe jako 16, float jako 24 bity)
+    out_audio = AudioSegment(pcm_bytes(processed, sample_width), frame_rate=rate,
+                             sample_width=sample_width, channels=channels)
+    for out_path, _ in outputs:
+        os.makedirs(os.path.dirname(out_path) or '.', exist_ok=True)
+    if len(outputs) == 1:
+        out_path, file_format = outputs[0]
+        export_audio_file(out_audio, out_path, format=file_format)
+    else:
+        # kilka formatow naraz z jednego renderu, kodery dzialaja rownolegle
+        report = save_audio_files(out_audio, [(out_path, {'format': file_format}) for out_path, file_format in outputs])
+        errors = [f"{path}: {result['error']}" for path, result in report.items() if result['error']]
+        if errors:
+            raise RuntimeError("; ".join(errors))
+
+    return len(samples) / rate, time.perf_counter() - start, meter.levels()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Przetwarzanie wsadowe plików audio efektami z final/")
+    parser.add_argument('input_dir', help="katalog z plikami wejściowymi (przeszukiwany rekurencyjnie)")
+    parser.add_argument('output_dir', help="katalog na wyniki, z tą samą strukturą podkatalogów")
+    parser.add_argument('--format', nargs='+', default=['mp3'], help="formaty wyjściowe (domyślnie mp3)")
+    parser.add_argument('--jobs', type=int, default=os.cpu_count(), help="liczba procesów (domyślnie wszystkie rdzenie)")
+    parser.add_argument('--force', action='store_true', help="przetwarzaj także aktualne wyniki")
+    parser.add_argument('--sample-rate', type=int, help="docelowa częstotliwość próbkowania w Hz (domyślnie jak w pliku)")
+    parser.add_argument('--distortion', type=float, nargs=3, metavar=('THRESHOLD_DB', 'LEVEL', 'GAIN_DB'))
+    parser.add_argument('--eq', type=float, nargs=3, metavar=('TREBLE', 'MID', 'BASS'))
+    parser.add_argument('--reverb', type=float, nargs=3, metavar=('DELAY_MS', 'DECAY', 'WETNESS'),
+                        help="echo ze sprzężeniem, DECAY i WETNESS od 0 do 1")
+    args = parser.parse_args(argv)
+
+    chain = build_chain(args)
+    jobs = []
+    skipped = 0
+    for file_path in find_inputs(args.input_dir):
+        outputs = [(output_path(file_path, args.input_dir, args.output_dir, file_format), file_format)
+                   for file_format in args.format]
+        if not args.force and all(is_up_to_date(file_path, out_path) for out_path, _ in outputs):
+            skipped += 1
+            continue
+        jobs.append((file_path, outputs))
+
+    print(f"Plików do przetworzenia: {len(jobs)}, pominiętych (aktualne): {skipped}")
+    if not jobs:
+        return 0
+
+    failed = 0
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        futures = {pool.submit(process_file, file_path, outputs, chain, args.sample_rate): file_path
+                   for file_path, outputs in jobs}
+        for done, future in enumerate(as_completed(futures), 1):
+            name = os.path.relpath(futures[future], args.input_dir)
+            try:
+                duration, elapsed, levels = future.result()
+                print(f"[{done}/{len(jobs)}] {name}: {elapsed:.2f} s ({duration / max(elapsed, 1e-9):.1f}x czasu rzeczywistego), "
+                      f"{levels['integrated']:.1f} LUFS, true peak {levels['true_peak']:.1f} dBTP")
+            except Exception as e:
+                failed += 1
+                print(f"[{done}/{len(jobs)}] {name}: Błąd: {e}")
+
+    print(f"Gotowe w {time.perf_counter() - start:.1f} s, błędów: {failed}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,28 +1,182 @@
 from pydub import AudioSegment
 from pydub.playback import play
+from pydub.utils import get_encoder_name, mediainfo_json
+import hashlib
+import numpy as np
 import os
+import queue
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
 
+# moduly z final/ sa importowane plasko, tak jak robi to GUI
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'final'))
 
-def read_audio_file(file_path):
+from disk_cache import DiskCache  # noqa: E402
+from sample_format import pcm_bytes, sample_dtype  # noqa: E402
+from wav_mmap import WAVE_FORMAT_PCM, open_wav_memmap  # noqa: E402
+
+
+def detect_format(file_path):
+    # rozpoznaj format po pierwszych bajtach pliku, a nie po rozszerzeniu
+    with open(file_path, 'rb') as f:
+        header = f.read(12)
+
+    if header[:4] == b'RIFF' and header[8:12] == b'WAVE':
+        return 'wav'
+    if header[:4] == b'OggS':
+        return 'ogg'
+    if header[:4] == b'fLaC':
+        return 'flac'
+    if header[:3] == b'ID3' or (len(header) >= 2 and header[0] == 0xFF and header[1] & 0xE0 == 0xE0):
+        # tag ID3 albo od razu naglowek ramki MPEG
+        return 'mp3'
+    if header[4:8] == b'ftyp':
+        return 'mp4'
+    return None
+
+
+def _decode(file_path, file_format):
+    if file_format == 'mp3':
+        return AudioSegment.from_mp3(file_path)
+    if file_format == 'wav':
+        return AudioSegment.from_wav(file_path)
+    if file_format == 'ogg':
+        return AudioSegment.from_ogg(file_path)
+    # na wypadek gdyby format byl inny niż standardowe
+    return AudioSegment.from_file(file_path)
+
+
+def file_digest(file_path):
+    # skrot calej zawartosci pliku, klucz pamieci podrecznej niezalezny od nazwy i sciezki
+    digest = hashlib.blake2b(digest_size=20)
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class PCMCache(DiskCache):
+    """
+    Pamiec podreczna zdekodowanego PCM dla plikow skompresowanych.
+
+    Kazdy wpis to surowy plik: 64-bajtowy naglowek (czestotliwosc, kanaly,
+    rozmiar probki, liczba ramek) i dane little-endian, nazwany skrotem
+    zawartosci pliku zrodlowego. Kolejne otwarcia mapuja go do pamieci
+    (np.memmap) zamiast dekodowac ffmpegiem. Po przekroczeniu max_bytes
+    usuwane sa najdawniej uzywane wpisy (DiskCache).
+    """
+
+    SUFFIX = '.pcm'
+    MAGIC = b'PCM1'
+    HEADER = struct.Struct('<4sIHHQ')
+    HEADER_BYTES = 64
+    DTYPES = {2: np.dtype('<i2'), 3: np.dtype((np.void, 3)), 4: np.dtype('<i4')}
+
+    def __init__(self, directory=os.path.join(os.path.expanduser('~'), '.cache', 'sem01_inf', 'pcm'),
+                 max_bytes=2 * 2 ** 30):
+        super().__init__(directory, max_bytes)
+
+    def load(self, digest):
+        # zwraca (memmap (ramki, kanaly), czestotliwosc, rozmiar probki) albo None
+        entry = self._entry_path(digest)
+        try:
+            with open(entry, 'rb') as f:
+                magic, sample_rate, channels, sample_width, frames = self.HEADER.unpack(f.read(self.HEADER.size))
+            if magic != self.MAGIC or sample_width not in self.DTYPES:
+                return None
+            if os.path.getsize(entry) < self.HEADER_BYTES + frames * channels * sample_width:
+                return None
+            if frames == 0:
+                samples = np.zeros((0, channels), dtype=self.DTYPES[sample_width])
+            else:
+                samples = np.memmap(entry, dtype=self.DTYPES[sample_width], mode='r',
+                                    offset=self.HEADER_BYTES, shape=(frames, channels))
+            self.touch(digest)
+        except (OSError, struct.error):
+            return None
+        return samples, sample_rate, sample_width
+
+    def store(self, digest, audio):
+        # 8-bitowe probki pydub trzyma ze znakiem, zapisujemy je jako 16-bitowe
+        if audio.sample_width == 1:
+            audio = audio.set_sample_width(2)
+        header = self.HEADER.pack(self.MAGIC, audio.frame_rate, audio.channels, audio.sample_width,
+                                  int(audio.frame_count()))
+
+        def write(f):
+            f.write(header.ljust(self.HEADER_BYTES, b'\0'))
+            f.write(audio.raw_data)
+
+        self.store_entry(digest, write)
+
+
+# wspolna pamiec podreczna, None wylacza ja
+PCM_CACHE = PCMCache()
+
+
+def read_audio_samples(file_path, cache=PCM_CACHE):
+    # probki jako tablica (ramki, kanaly) bez AudioSegment; WAV jest mapowany prosto
+    # z pliku, plik skompresowany jest dekodowany tylko za pierwszym razem, potem
+    # mapowany z pamieci podrecznej
+    # zwraca (probki, czestotliwosc, rozmiar probki), 24 bity jako elementy 3-bajtowe
+    if not os.path.exists(file_path):
+        raise FileNotFoundError("Błąd: Plik nie istnieje")
+
+    file_format = detect_format(file_path)
+    if file_format == 'wav':
+        try:
+            samples, info = open_wav_memmap(file_path)
+        except ValueError:
+            # WAV skompresowany (np. ADPCM) idzie przez dekoder jak mp3/ogg
+            samples = None
+        if samples is not None:
+            if info.format_tag != WAVE_FORMAT_PCM:
+                # probki float zostaja float, wynik zapisujemy jako 24-bitowy PCM (tak jak GUI)
+                return samples, info.sample_rate, 3
+            if info.sample_width == 1:
+                # 8 bitow bez znaku na 16 ze znakiem, tak jak przy dekodowaniu przez pydub
+                samples = (samples.astype(np.int16) - 128) << 8
+                return samples, info.sample_rate, 2
+            return samples, info.sample_rate, info.sample_width
+
+    if cache is not None:
+        digest = file_digest(file_path)
+        cached = cache.load(digest)
+        if cached is None:
+            cache.store(digest, _decode(file_path, file_format))
+            cached = cache.load(digest)
+        if cached is not None:
+            return cached
+
+    audio = _decode(file_path, file_format)
+    if audio.sample_width == 1:
+        audio = audio.set_sample_width(2)
+    samples = np.frombuffer(audio.raw_data, dtype=PCMCache.DTYPES[audio.sample_width]).reshape(-1, audio.channels)
+    return samples, audio.frame_rate, audio.sample_width
+
+
+def read_audio_file(file_path, cache=PCM_CACHE):
     try:
         # sprawdz czy plik istnieje
         if not os.path.exists(file_path):
             raise FileNotFoundError("Błąd: Plik nie istnieje")
 
-        # znajdz rozszerzenie file.wav
-        file_ext = str(file_path[-4:])
+        # rozpoznaj format po zawartosci pliku
+        file_format = detect_format(file_path)
 
         # Load the audio file
         print("Ładowanie pliku...")
-        if file_ext == '.mp3':
-            audio = AudioSegment.from_mp3(file_path)
-        elif file_ext == '.wav':
-            audio = AudioSegment.from_wav(file_path)
-        elif file_ext == '.ogg':
-            audio = AudioSegment.from_ogg(file_path)
+        if file_format != 'wav' and cache is not None:
+            # zdekodowany PCM z pamieci podrecznej, dekodowanie tylko przy pierwszym otwarciu
+            samples, sample_rate, sample_width = read_audio_samples(file_path, cache)
+            audio = AudioSegment(samples.tobytes(), frame_rate=sample_rate,
+                                 sample_width=sample_width, channels=samples.shape[1])
         else:
-            # na wypadek gdyby format byl inny niż standardowe
-            audio = AudioSegment.from_file(file_path)
+            audio = _decode(file_path, file_format)
 
 
         # informacje o pliku w kolejnosci: dlugosc (trzeba przeknowertować na sekundy), ilosc kanałów, rozmiar próbki, rozdzielczosc pliku
@@ -32,17 +186,272 @@ def read_audio_file(file_path):
     except Exception as e:
         print(f"Błąd: {str(e)}")
 
+
+class AudioStream:
+    """
+    Strumieniowe dekodowanie pliku audio blokami PCM.
+
+    ffmpeg dekoduje plik do potoku, osobny watek czyta z niego bloki po
+    block_frames ramek do kolejki o ograniczonym rozmiarze (read_ahead),
+    wiec pamiec jest stala, a przetwarzanie moze ruszyc przed koncem
+    dekodowania. Iteracja zwraca tablice int16 o ksztalcie (ramki, kanaly).
+    """
+
+    def __init__(self, file_path, block_frames=4096, read_ahead=8, sample_rate=None, channels=None):
+        if not os.path.exists(file_path):
+            raise FileNotFoundError("Błąd: Plik nie istnieje")
+
+        # parametry strumienia audio z ffprobe, o ile nie podano docelowych
+        if sample_rate is None or channels is None:
+            streams = [s for s in mediainfo_json(file_path).get('streams', []) if s.get('codec_type') == 'audio']
+            if not streams:
+                raise ValueError(f"Brak strumienia audio w pliku {file_path}")
+            sample_rate = sample_rate or streams[0]['sample_rate']
+            channels = channels or streams[0]['channels']
+        self.sample_rate = int(sample_rate)
+        self.channels = int(channels)
+        self.format = detect_format(file_path)
+
+        self.block_frames = block_frames
+        self._frame_bytes = 2 * self.channels
+        self._queue = queue.Queue(maxsize=read_ahead)
+        self._stop = threading.Event()
+
+        command = [get_encoder_name(), '-v', 'error', '-nostdin', '-i', file_path,
+                   '-f', 's16le', '-acodec', 'pcm_s16le',
+                   '-ar', str(self.sample_rate), '-ac', str(self.channels), '-']
+        # stderr do pliku tymczasowego, a nie do potoku, ktorego nikt nie czyta w trakcie
+        self._stderr = tempfile.TemporaryFile()
+        self._process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=self._stderr)
+        self._reader = threading.Thread(target=self._read_blocks, daemon=True)
+        self._reader.start()
+
+    def _put(self, item):
+        # nie blokuj sie na zawsze, jezeli odbiorca juz zamknal strumien
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _read_blocks(self):
+        block_bytes = self.block_frames * self._frame_bytes
+        try:
+            while not self._stop.is_set():
+                data = self._process.stdout.read(block_bytes)
+                # obetnij niepelna ramke na koncu strumienia
+                data = data[:len(data) - len(data) % self._frame_bytes]
+                if not data:
+                    break
+                block = np.frombuffer(data, dtype=np.int16).reshape(-1, self.channels)
+                if not self._put(block):
+                    return
+            # uszkodzony lub uciety plik konczy strumien wczesniej; bez tego
+            # sprawdzenia krotsze audio wygladaloby na kompletne
+            if self._process.wait() != 0 and not self._stop.is_set():
+                self._stderr.seek(0)
+                message = self._stderr.read().decode(errors='replace').strip()
+                raise RuntimeError(f"Błąd dekodowania (kod {self._process.returncode}): {message}")
+        except Exception as e:
+            self._put(e)
+            return
+        self._put(None)
+
+    def __iter__(self):
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            self.close()
+
+    def close(self):
+        self._stop.set()
+        if self._process.poll() is None:
+            self._process.kill()
+        self._process.wait()
+        self._process.stdout.close()
+        self._stderr.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def stream_audio_file(file_path, block_frames=4096, read_ahead=8, **kwargs):
+    # generator blokow PCM, np. do efektow albo eksportu bez wczytywania calego pliku
+    return AudioStream(file_path, block_frames, read_ahead, **kwargs)
+
+
+def _temporary_path(output_path):
+    # plik tymczasowy obok docelowego, zeby os.replace nie przenosil miedzy dyskami
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(output_path)),
+                                     prefix='.' + os.path.basename(output_path), suffix='.part')
+    os.close(fd)
+    return temp_path
+
+
+def export_audio_file(audio, output_path, **kwargs):
+    # jak save_audio_file, ale bledy sa zglaszane wyjatkiem; plik docelowy
+    # pojawia sie dopiero po udanym kodowaniu, wiec przerwany zapis nie
+    # zostawia niepelnego pliku ani nie nadpisuje starego wyniku
+    parameters = {'format': 'mp3', 'bitrate': '192k', 'tags': {}}
+    parameters.update(kwargs)
+    temp_path = _temporary_path(output_path)
+    try:
+        audio.export(temp_path, **parameters).close()
+        os.replace(temp_path, output_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+
 def save_audio_file(audio, output_path,**kwargs):
     try:
         #domyslnie używamy mp3
-        parameters = {'format': 'mp3','bitrate':'192k','tags':{}}
-        parameters.update(kwargs) #zmien domyslne argumenty jezeli takie zostaną podane
-        audio.export(output_path,**parameters)
+        export_audio_file(audio, output_path, **kwargs) #zmien domyslne argumenty jezeli takie zostaną podane
         print('Zapisano')
     except Exception as e:
         print(f'Błąd podczas zapisywania: {str(e)}')
 
 
+# format surowego PCM dla ffmpeg wedlug rozmiaru probki (8 bitow bez znaku, jak w WAV)
+PCM_FORMATS = {1: 'u8', 2: 's16le', 3: 's24le', 4: 's32le'}
+
+
+class _StreamEncoder:
+    # jeden proces ffmpeg czytajacy PCM z potoku i zapisujacy jeden plik wyjsciowy
+
+    def __init__(self, output_path, sample_rate, channels, queue_blocks, sample_width=2, **kwargs):
+        parameters = {'format': 'mp3', 'bitrate': '192k', 'tags': {}}
+        parameters.update(kwargs)
+
+        command = [get_encoder_name(), '-v', 'error', '-y', '-f', PCM_FORMATS[sample_width],
+                   '-ar', str(sample_rate), '-ac', str(channels), '-i', '-']
+        if parameters.get('codec'):
+            command += ['-acodec', parameters['codec']]
+        if parameters.get('bitrate') and parameters['format'] != 'wav':
+            command += ['-b:a', parameters['bitrate']]
+        for key, value in (parameters.get('tags') or {}).items():
+            command += ['-metadata', f'{key}={value}']
+        command += list(parameters.get('parameters') or [])
+        # koder pisze do pliku tymczasowego, finish przenosi go na miejsce po sukcesie
+        self._temp_path = _temporary_path(output_path)
+        command += ['-f', parameters['format'], self._temp_path]
+
+        self.output_path = output_path
+        self.bytes_written = 0
+        self.error = None
+        self._queue = queue.Queue(maxsize=queue_blocks)
+        self._start = time.perf_counter()
+        self.elapsed = 0.0
+        # stderr do pliku tymczasowego, tak jak w AudioStream; potok czytany dopiero
+        # po zakonczeniu moglby sie zapelnic i zablokowac ffmpeg
+        self._stderr = tempfile.TemporaryFile()
+        try:
+            self._process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=self._stderr)
+        except BaseException:
+            self._stderr.close()
+            os.unlink(self._temp_path)
+            raise
+        self._writer = threading.Thread(target=self._write_blocks, daemon=True)
+        self._writer.start()
+
+    def _write_blocks(self):
+        try:
+            while True:
+                data = self._queue.get()
+                if data is None:
+                    break
+                self._process.stdin.write(data)
+                self.bytes_written += len(data)
+        except Exception as e:
+            self.error = e
+            # odbieraj dalej bloki, zeby nie zablokowac pozostalych koderow
+            while self._queue.get() is not None:
+                pass
+        finally:
+            self._process.stdin.close()
+
+    def put(self, data):
+        self._queue.put(data)
+
+    def finish(self):
+        self._queue.put(None)
+        self._writer.join()
+        self._process.wait()
+        self.elapsed = time.perf_counter() - self._start
+        if self._process.returncode != 0:
+            # przyczyna jest w komunikacie ffmpeg, a nie w "Broken pipe" z zapisu do potoku
+            self._stderr.seek(0)
+            message = self._stderr.read().decode(errors='replace').strip()
+            self.error = RuntimeError(f"Błąd kodowania (kod {self._process.returncode}): {message}")
+        self._stderr.close()
+        if self.error is None:
+            os.replace(self._temp_path, self.output_path)
+        elif os.path.exists(self._temp_path):
+            os.unlink(self._temp_path)
+
+
+def export_audio_streams(blocks, sample_rate, channels, outputs, queue_blocks=8, sample_width=2):
+    # zapis jednego renderu do wielu formatow naraz: kazdy blok PCM trafia
+    # rownolegle do wszystkich koderow, kolejki maja ograniczony rozmiar,
+    # wiec pamiec nie rosnie z dlugoscia pliku
+    # outputs: lista (sciezka, {'format': ..., 'bitrate': ..., 'tags': ...})
+    # bloki w innym formacie niz sample_width sa konwertowane (np. float32 z efektow)
+    encoders = [_StreamEncoder(path, sample_rate, channels, queue_blocks, sample_width, **options)
+                for path, options in outputs]
+
+    frames = 0
+    for block in blocks:
+        block = np.asarray(block)
+        frames += len(block) if block.ndim == 2 else len(block) // channels
+        data = pcm_bytes(block, sample_width)
+        for encoder in encoders:
+            encoder.put(data)
+
+    duration = frames / sample_rate
+    report = {}
+    for encoder in encoders:
+        encoder.finish()
+        report[encoder.output_path] = {
+            'seconds': encoder.elapsed,
+            'bytes_in': encoder.bytes_written,
+            'realtime_factor': duration / encoder.elapsed if encoder.elapsed else float('inf'),
+            'error': str(encoder.error) if encoder.error else None,
+        }
+        if encoder.error:
+            print(f'Błąd podczas zapisywania {encoder.output_path}: {encoder.error}')
+        else:
+            print(f'Zapisano {encoder.output_path}: {encoder.elapsed:.2f} s '
+                  f'({report[encoder.output_path]["realtime_factor"]:.1f}x czasu rzeczywistego, '
+                  f'{encoder.bytes_written / 2 ** 20 / max(encoder.elapsed, 1e-9):.1f} MB/s PCM)')
+    return report
+
+
+def save_audio_files(audio, outputs, block_frames=65536):
+    # jak save_audio_file, ale wiele formatow z jednego AudioSegment bez plikow tymczasowych;
+    # koder dostaje probki w rozdzielczosci zrodla
+    # 8-bitowe probki pydub trzyma ze znakiem, zapisujemy je jako 16-bitowe
+    if audio.sample_width == 1:
+        audio = audio.set_sample_width(2)
+    dtype = sample_dtype(audio.sample_width)
+    data = memoryview(audio.raw_data)
+    block_bytes = block_frames * audio.frame_width
+    blocks = (np.frombuffer(data[i:i + block_bytes], dtype=dtype).reshape(-1, audio.channels)
+              for i in range(0, len(data), block_bytes))
+    return export_audio_streams(blocks, audio.frame_rate, audio.channels, outputs,
+                                sample_width=audio.sample_width)
+
 
 if __name__ == "__main__":
     file_path = "file01.wav"  # test
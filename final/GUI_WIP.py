@@ -2,17 +2,25 @@ import sys
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QAction, QVBoxLayout, QHBoxLayout,
     QSlider, QDial, QTableWidget, QTableWidgetItem, QLineEdit, QLabel,
-    QSpinBox, QWidget, QFileDialog, QPushButton
+    QSpinBox, QWidget, QFileDialog, QPushButton, QCheckBox, QProgressBar
 )
-from PyQt5.QtCore import Qt
-from pyqtgraph import PlotWidget
+from PyQt5.QtCore import Qt, QTimer, QRectF
+from PyQt5.QtGui import QKeySequence
+from pyqtgraph import PlotWidget, ImageItem, LinearRegionItem, colormap
 import wave
 import numpy as np
 from scipy.io.wavfile import write
 from scipy.io import wavfile
-from equalizer import equalize
-from echo import add_reverb
-from distortion import apply_distortion
+from chain import EffectChain, DistortionStage, EqualizerStage, EchoStage, StageCache
+from render_worker import RenderWorker
+from waveform import PeakPyramid, PyramidCache, PieceOverview
+from spectrogram import Spectrogram
+from audio_document import AudioDocument
+from analysis_cache import AnalysisCache
+from edit import EditBuffer
+from sample_format import pcm_bytes
+from wav_mmap import WAVE_FORMAT_PCM
+from playback import PlaybackEngine, SoundDeviceSink
 
 
 class AudioGUI(QMainWindow):
@@ -21,116 +29,365 @@ class AudioGUI(QMainWindow):
         options = QFileDialog.Options()
         file_path, _ = QFileDialog.getOpenFileName(self, "Open WAV File", "", "WAV Files (*.wav)", options=options)
         if file_path:
-            self.table_update(file_path)
-            if self.graphType == "A(t)":
-                self.load_wave(file_path)
-            elif self.graphType == "A(f)":
-                self.load_wave_FFT(file_path)
+            self.render_worker.cancel()
+            self.stop_audio()
+            self.render_cache.clear()
+            self.save_analysis()
+            self.document = AudioDocument.open(file_path, self.analysis_cache)
+            self.edits = EditBuffer(self.document.samples, channels=self.document.channels)
+            self.edited_revision = 0
+            # The original samples are one block of the piece table, new blocks get their own pyramids
+            self.original_block = self.edits.pieces[0].block if self.edits.frames else None
+            self.block_overviews = PyramidCache()
+            self.processed_audio = None
+            self.processed_overview = None
+            self.processed_spectrogram = None
+
+            self.table_update()
+            duration = self.document.duration
+            self.region.setRegion((0, duration / 10))
+            self.region.show()
+            self.show_graph(reset_view=True)
+            self.save_analysis()
+
+    def save_analysis(self):
+        if self.document is not None:
+            try:
+                self.document.save_analysis()
+            except OSError as e:
+                print(f"Analysis cache error: {e}")
+
+    def closeEvent(self, event):
+        self.stop_audio()
+        self.save_analysis()
+        super().closeEvent(event)
 
     def save_audio(self):
         file_path, _ = QFileDialog.getSaveFileName(self, "Save Audio", "", "WAV (*.wav)")
-        if file_path and hasattr(self, 'raw_audio_data') and hasattr(self, 'wav_params'):
+        if file_path and self.document is not None:
             try:
+                # Keep the source's integer sample width; float sources are saved as 24-bit PCM
+                info = self.document.info
+                sample_width = info.sample_width if info.format_tag == WAVE_FORMAT_PCM else 3
                 with wave.open(file_path, 'wb') as out_file:
-                    out_file.setnchannels(1)
-                    out_file.setsampwidth(2)
-                    out_file.setframerate(self.wav_params.framerate)
-                    out_file.writeframes(self.raw_audio_data.astype(np.int16).tobytes())
+                    out_file.setnchannels(self.document.channels)
+                    out_file.setsampwidth(sample_width)
+                    out_file.setframerate(self.document.sample_rate)
+                    # The only place the edited audio is materialized as a whole
+                    out_file.writeframes(pcm_bytes(np.asarray(self.output_audio()), sample_width))
                 print(f"Audio saved successfully to: {file_path}")
             except Exception as e:
                 print(f"Save error: {e}")
 
-    def table_update(self, file_path):
-        import os
-        file_name = os.path.basename(file_path)
-        file_size = os.path.getsize(file_path)
-
-        with wave.open(file_path, 'rb') as wav_file:
-            n_frames = wav_file.getnframes()
-            framerate = wav_file.getframerate()
-            duration = n_frames / framerate
-
-            data = wav_file.readframes(n_frames)
-            wave_data = np.frombuffer(data, dtype=np.int16)
-
-            max_amplitude = np.max(np.abs(wave_data))
-
-        self.file_table.setItem(0, 0, QTableWidgetItem(file_name))
-        self.file_table.setItem(0, 1, QTableWidgetItem(str(file_size)))
-        self.file_table.setItem(0, 2, QTableWidgetItem(f"{duration:.2f}"))
-        self.file_table.setItem(0, 3, QTableWidgetItem(f"{20 * np.log10(max_amplitude):.2f}"))
-
-    def load_wave(self, file_path):
+    def table_update(self):
+        document = self.document
+
+        self.file_table.setItem(0, 0, QTableWidgetItem(document.file_name))
+        self.file_table.setItem(0, 1, QTableWidgetItem(str(document.file_size)))
+        self.file_table.setItem(0, 2, QTableWidgetItem(f"{document.duration:.2f}"))
+        # Metering the whole file takes seconds: do it in the background and fill the row in after
+        for column in range(3, 3 + len(self.LEVEL_COLUMNS)):
+            self.file_table.setItem(0, column, QTableWidgetItem("..."))
+        self.render_worker.run_task(document.measure_levels,
+                                    lambda levels: self.levels_measured(document, levels))
+
+    def levels_measured(self, document, levels):
+        if document is self.document:
+            self.show_levels(0, levels)
+            self.save_analysis()
+
+    # Table columns of the metering levels, after name, size and time
+    LEVEL_COLUMNS = ('peak', 'true_peak', 'rms', 'integrated')
+
+    def show_levels(self, row, levels):
+        for column, name in enumerate(self.LEVEL_COLUMNS, 3):
+            self.file_table.setItem(row, column, QTableWidgetItem(f"{levels[name]:.2f}"))
+
+    def update_meter(self):
+        # Row 1 shows what the player has sent to the sound card so far
+        if self.player is None:
+            self.meter_timer.stop()
+            return
+        self.show_levels(1, self.player.meter.levels())
+
+    def source_audio(self):
+        # The file with the edits applied: effects, playback and views start from it.
+        # A snapshot of the piece table, so an edit costs O(pieces), not a copy of the file,
+        # and the views read only what they show
+        if self.edits.revision == 0:
+            return self.document.samples
+        if self.edited_revision != self.edits.revision:
+            self.edited_audio = self.edits.snapshot()
+            self.edited_overview = PieceOverview(self.edited_audio, self.block_overview)
+            self.edited_spectrogram = Spectrogram(self.edited_audio, self.document.sample_rate)
+            self.edited_revision = self.edits.revision
+        return self.edited_audio
+
+    def block_overview(self, block):
+        # The original block's pyramid is the document's, possibly loaded from the analysis cache
+        if block is self.original_block:
+            return self.document.overview
+        return self.block_overviews.get(block)
+
+    def source_overview(self):
+        self.source_audio()
+        return self.document.overview if self.edits.revision == 0 else self.edited_overview
+
+    def source_spectrogram(self):
+        self.source_audio()
+        return self.document.spectrogram if self.edits.revision == 0 else self.edited_spectrogram
+
+    def selection(self):
+        # Selected region in frames
+        rate = self.document.sample_rate
+        start, stop = self.region.getRegion()
+        start = int(np.clip(round(start * rate), 0, self.edits.frames))
+        stop = int(np.clip(round(stop * rate), start, self.edits.frames))
+        return start, stop
+
+    def edit_done(self):
+        # The source changed: the processed result is stale
+        self.render_worker.cancel()
+        self.stop_audio()
+        self.processed_audio = None
+        self.processed_overview = None
+        self.processed_spectrogram = None
+        self.show_graph()
+        self.schedule_preview()
+
+    def cut_selection(self):
+        if self.document is not None:
+            self.clipboard = self.edits.cut(*self.selection())
+            self.edit_done()
+
+    def copy_selection(self):
+        if self.document is not None:
+            self.clipboard = self.edits.copy(*self.selection())
+
+    def paste_clipboard(self):
+        # The clipboard replaces the selection
+        if self.document is not None and self.clipboard is not None:
+            start, stop = self.selection()
+            self.edits.paste(start, self.clipboard, stop)
+            self.edit_done()
+
+    def delete_selection(self):
+        if self.document is not None:
+            self.edits.delete(*self.selection())
+            self.edit_done()
+
+    def trim_to_selection(self):
+        if self.document is not None:
+            self.edits.trim(*self.selection())
+            self.edit_done()
+
+    def apply_to_selection(self):
+        # Render the effects into the selected range only, in the background;
+        # apply_finished turns the result into an undoable edit
+        if self.document is None:
+            return
+        start, stop = self.selection()
+        if stop > start:
+            key = (self.document.path, self.edits.revision, start, stop)
+            self.progress_bar.setValue(0)
+            self.render_worker.start(self.build_chain(), self.edits.snapshot(start, stop),
+                                     self.document.sample_rate, self.render_cache, source_key=key)
+            self.pending_apply = (self.edits.revision, start, stop)
+
+    def apply_finished(self, processed):
+        revision, start, stop = self.pending_apply
+        self.pending_apply = None
+        if self.document is not None and revision == self.edits.revision:
+            self.edits.replace(start, stop, processed)
+            self.edit_done()
+
+    def undo_edit(self):
+        if self.document is not None and self.edits.undo():
+            self.edit_done()
+
+    def redo_edit(self):
+        if self.document is not None and self.edits.redo():
+            self.edit_done()
+
+    def show_graph(self, reset_view=False):
+        if self.document is None:
+            return
+        self.region.setBounds((0, self.edits.frames / self.document.sample_rate))
         if self.graphType == "A(t)":
-            with wave.open(file_path, 'rb') as wav_file:
-                self.wav_params = wav_file.getparams()
-                n_channels = wav_file.getnchannels()
-                sample_width = wav_file.getsampwidth()
-                framerate = wav_file.getframerate()
-                n_frames = wav_file.getnframes()
-
-                data = wav_file.readframes(n_frames)
-                wave_data = np.frombuffer(data, dtype=np.int16)
-
-                if n_channels == 2:
-                    wave_data = wave_data.reshape(-1, 2).mean(axis=1)
-
-                duration = n_frames / framerate
-                time = np.linspace(0, duration, num=len(wave_data))
-
-                self.graph.clear()
-                self.graph.plot(time, wave_data, pen='r')
-
-                self.raw_audio_data = wave_data
-                self.audio_file_path = file_path
-
-    def load_wave_FFT(self, file_path):
-        if self.graphType == "A(f)":
-            with wave.open(file_path, 'rb') as wav_file:
-                n_channels = wav_file.getnchannels()
-                framerate = wav_file.getframerate()
-                n_frames = wav_file.getnframes()
-
-                data = wav_file.readframes(n_frames)
-                wave_data = np.frombuffer(data, dtype=np.int16)
-
-                wave_data = wave_data.reshape(-1, n_channels)
-                channel_data = wave_data[:, 0]
-
-                freqs = np.fft.rfftfreq(n_frames, 1 / framerate)
-                fft_magnitudes = np.abs(np.fft.rfft(channel_data))
-
-                self.graph.clear()
-                self.graph.plot(freqs, fft_magnitudes, pen='b')
+            self.load_wave(reset_view)
+        elif self.graphType == "A(f)":
+            self.load_wave_FFT(reset_view)
+
+    def load_wave(self, reset_view=False):
+        overview = self.processed_overview or self.source_overview()
+        self.show_waveform(overview, self.document.sample_rate, reset_view)
+
+    def load_wave_FFT(self, reset_view=False):
+        spectrogram = self.processed_spectrogram or self.source_spectrogram()
+        duration = spectrogram.frames / spectrogram.sample_rate
+
+        self.waveform_curve.setData([], [])
+        self.spectrogram_image.show()
+        self.graph.setLimits(xMin=0, xMax=duration, yMin=0, yMax=spectrogram.max_frequency)
+        self.graph.setYRange(0, spectrogram.max_frequency, padding=0)
+        if reset_view or self.graph.getViewBox().viewRange()[0][1] > duration:
+            self.graph.setXRange(0, duration, padding=0)
+        self.update_spectrogram_view()
+
+    def build_chain(self, engine="fft"):
+        threshold_db = self.threshold_input.value()
+        level = self.level_dial.value()
+        gain_db = self.gain_input.value()
+
+        treble = self.treble_slider.value()
+        mid = self.mid_slider.value()
+        bass = self.bass_slider.value()
+        feedback = self.decay_dial.value() / 100.0
+        wetness = self.wetness_dial.value() / 100.0
+        delay = self.delay_input.value()
+
+        return EffectChain([
+            DistortionStage(threshold_db, level, gain_db),
+            EqualizerStage(treble, mid, bass, engine),
+            EchoStage(delay, feedback, wetness),
+        ])
+
+    def play_audio(self):
+        if self.document is None:
+            return
+        self.stop_audio()
+        # Blocks go through a streaming copy of the chain while playing
+        self.player = PlaybackEngine(self.source_audio(), self.document.sample_rate,
+                                     SoundDeviceSink(), self.build_chain(engine="iir"))
+        try:
+            self.player.play()
+            self.meter_timer.start()
+        except Exception as e:
+            self.player = None
+            print(f"Playback error: {e}")
+
+    def stop_audio(self):
+        if self.player is not None:
+            self.player.stop()
+            self.update_meter()
+            print(f"Playback stopped at {self.player.position:.2f} s, underruns: {self.player.underruns}")
+            self.player = None
 
     def refresh_action(self):
-        if hasattr(self, 'raw_audio_data') and hasattr(self, 'wav_params'):
-            threshold_db = self.threshold_input.value()
-            level = self.level_dial.value()
-            gain_db = self.gain_input.value()
-
-            treble = self.treble_slider.value()
-            mid = self.mid_slider.value()
-            bass = self.bass_slider.value()
-            decay = self.decay_dial.value() / 10.0
-            wetness = self.wetness_dial.value() / 10.0
-            delay = self.delay_input.value()
-
-            processed_audio = apply_distortion(self.raw_audio_data, threshold_db, level, gain_db)
-            processed_audio = equalize(processed_audio, self.wav_params.framerate, treble, mid, bass)
-            processed_audio = add_reverb(processed_audio, delay, decay, wetness)
-
-            self.raw_audio_data = processed_audio
-            duration = len(processed_audio) / self.wav_params.framerate
-            time = np.linspace(0, duration, num=len(processed_audio))
-
-            self.graph.clear()
-            self.graph.plot(time, processed_audio, pen='r')
+        # An empty file (or one edited down to nothing) has nothing to render
+        if self.document is not None and self.edits.frames:
+            chain = self.build_chain()
+            # Render from the edited source in the background, reusing unchanged stages;
+            # the revision keeps cached stages valid across undo and redo
+            self.progress_bar.setValue(0)
+            self.render_worker.start(chain, self.source_audio(), self.document.sample_rate,
+                                     self.render_cache, source_key=(self.document.path, self.edits.revision))
+
+    def render_failed(self, message):
+        self.pending_apply = None
+        print(f"Render error: {message}")
+
+    def render_cancelled(self):
+        self.progress_bar.setValue(0)
+        self.pending_apply = None
+
+    def schedule_preview(self):
+        if self.live_preview.isChecked():
+            self.preview_timer.start()
+
+    def render_finished(self, processed_audio):
+        if self.pending_apply is not None:
+            self.apply_finished(processed_audio)
+        elif self.document is not None:
+            self.processed_audio = processed_audio
+            self.processed_overview = PeakPyramid(processed_audio)
+            self.processed_spectrogram = Spectrogram(processed_audio, self.document.sample_rate)
+            self.show_graph()
+
+    def show_waveform(self, pyramid, framerate, reset_view=False):
+        self.pyramid = pyramid
+        self.pyramid_rate = framerate
+        duration = pyramid.frames / framerate
+
+        self.spectrogram_image.hide()
+        self.graph.setLimits(xMin=0, xMax=duration, yMin=None, yMax=None)
+        if reset_view or self.graph.getViewBox().viewRange()[0][1] > duration:
+            self.graph.setXRange(0, duration, padding=0)
+        self.graph.enableAutoRange(axis='y')
+        self.update_waveform_view()
+
+    def update_view(self):
+        if self.document is None:
+            return
+        if self.graphType == "A(t)":
+            self.update_waveform_view()
+        elif self.graphType == "A(f)":
+            self.update_spectrogram_view()
+
+    def update_waveform_view(self):
+        # Draw only the visible range, at a level of detail that fits the view
+        if getattr(self, 'pyramid', None) is None:
+            return
+        x_min, x_max = self.graph.getViewBox().viewRange()[0]
+        positions, values = self.pyramid.view(x_min * self.pyramid_rate, x_max * self.pyramid_rate,
+                                              self.WAVEFORM_POINTS)
+        self.waveform_curve.setData(positions / self.pyramid_rate, values)
+
+    def update_spectrogram_view(self):
+        # Only the tiles of the visible time range are computed, at the zoom level of the view
+        spectrogram = self.processed_spectrogram or self.source_spectrogram()
+        rate = spectrogram.sample_rate
+        x_min, x_max = self.graph.getViewBox().viewRange()[0]
+        image, first, last = spectrogram.image(x_min * rate, x_max * rate, self.SPECTROGRAM_COLUMNS)
+        if len(image) == 0:
+            return
+
+        top = float(image.max())
+        self.spectrogram_image.setImage(image, autoLevels=False, levels=(top - 90, top))
+        self.spectrogram_image.setRect(QRectF(first / rate, 0, (last - first) / rate, spectrogram.max_frequency))
+
+    def output_audio(self):
+        if self.processed_audio is not None:
+            return self.processed_audio
+        return self.source_audio()
+
+    # Upper bound of points drawn for the visible part of the waveform
+    WAVEFORM_POINTS = 4000
+    # Upper bound of spectrogram columns computed for the visible time range
+    SPECTROGRAM_COLUMNS = 1500
 
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Audio GUI")
         self.graphType = "A(t)"
+        self.document = None
+        self.edits = None
+        self.clipboard = None
+        # (revision, start, stop) of an Apply effects to selection render in progress
+        self.pending_apply = None
+        self.processed_audio = None
+        self.processed_overview = None
+        self.processed_spectrogram = None
+        self.player = None
+        self.render_cache = StageCache()
+        self.analysis_cache = AnalysisCache()
+
+        self.render_worker = RenderWorker(self)
+        self.render_worker.progress.connect(lambda percent: self.progress_bar.setValue(percent))
+        self.render_worker.finished.connect(self.render_finished)
+        self.render_worker.failed.connect(self.render_failed)
+        self.render_worker.cancelled.connect(self.render_cancelled)
+
+        # Live preview renders once the controls have been still for a moment
+        self.preview_timer = QTimer(self)
+        self.preview_timer.setSingleShot(True)
+        self.preview_timer.setInterval(250)
+        self.preview_timer.timeout.connect(self.refresh_action)
+
+        # Playback levels refresh
+        self.meter_timer = QTimer(self)
+        self.meter_timer.setInterval(200)
+        self.meter_timer.timeout.connect(self.update_meter)
 
         main_widget = QWidget()
         main_layout = QVBoxLayout()
@@ -145,6 +402,23 @@ class AudioGUI(QMainWindow):
         file_menu.addAction(open_action)
         file_menu.addAction(save_action)
 
+        edit_menu = menu_bar.addMenu("Edit")
+        for name, shortcut, slot in [
+            ("Undo", QKeySequence.Undo, self.undo_edit),
+            ("Redo", QKeySequence.Redo, self.redo_edit),
+            ("Cut", QKeySequence.Cut, self.cut_selection),
+            ("Copy", QKeySequence.Copy, self.copy_selection),
+            ("Paste", QKeySequence.Paste, self.paste_clipboard),
+            ("Delete", QKeySequence.Delete, self.delete_selection),
+            ("Trim to selection", None, self.trim_to_selection),
+            ("Apply effects to selection", None, self.apply_to_selection),
+        ]:
+            action = QAction(name, self)
+            if shortcut is not None:
+                action.setShortcut(shortcut)
+            action.triggered.connect(slot)
+            edit_menu.addAction(action)
+
         graph_menu = menu_bar.addMenu("Graph")
         at_action = QAction("A(t)", self)
         af_action = QAction("A(f)", self)
@@ -154,6 +428,17 @@ class AudioGUI(QMainWindow):
         graph_menu.addAction(af_action)
 
         self.graph = PlotWidget()
+        self.waveform_curve = self.graph.plot(pen='r')
+        self.spectrogram_image = ImageItem()
+        self.spectrogram_image.setLookupTable(colormap.get('viridis').getLookupTable())
+        self.spectrogram_image.hide()
+        self.graph.addItem(self.spectrogram_image)
+        # Selected time range for the Edit menu
+        self.region = LinearRegionItem()
+        self.region.setZValue(10)
+        self.region.hide()
+        self.graph.addItem(self.region)
+        self.graph.getViewBox().sigXRangeChanged.connect(self.update_view)
         main_layout.addWidget(self.graph)
 
         controls_layout = QHBoxLayout()
@@ -226,15 +511,36 @@ class AudioGUI(QMainWindow):
         main_controls_layout.addLayout(controlsThGn_layout)
         main_layout_bottom.addLayout(main_controls_layout)
 
-        self.file_table = QTableWidget(2, 4)
-        self.file_table.setHorizontalHeaderLabels(["File name", "File size [B]", "Time [s]", "Max Amplitude [dB]"])
+        self.file_table = QTableWidget(2, 7)
+        self.file_table.setHorizontalHeaderLabels(["File name", "File size [B]", "Time [s]", "Peak [dBFS]",
+                                                   "True peak [dBTP]", "RMS [dBFS]", "Loudness [LUFS]"])
+        self.file_table.setVerticalHeaderLabels(["File", "Playback"])
         self.file_table.horizontalHeader().setStyleSheet("color: black")
         TbRf_layout.addWidget(self.file_table)
         self.refresh_button = QPushButton("Refresh", self)
         self.refresh_button.clicked.connect(self.refresh_action)
         TbRf_layout.addWidget(self.refresh_button)
+        self.play_button = QPushButton("Play", self)
+        self.play_button.clicked.connect(self.play_audio)
+        TbRf_layout.addWidget(self.play_button)
+        self.stop_button = QPushButton("Stop", self)
+        self.stop_button.clicked.connect(self.stop_audio)
+        TbRf_layout.addWidget(self.stop_button)
+        self.live_preview = QCheckBox("Live preview", self)
+        TbRf_layout.addWidget(self.live_preview)
+        self.progress_bar = QProgressBar(self)
+        self.progress_bar.setRange(0, 100)
+        TbRf_layout.addWidget(self.progress_bar)
+        self.cancel_button = QPushButton("Cancel", self)
+        self.cancel_button.clicked.connect(self.render_worker.cancel)
+        TbRf_layout.addWidget(self.cancel_button)
         main_layout_bottom.addLayout(TbRf_layout)
 
+        for control in (self.treble_slider, self.mid_slider, self.bass_slider, self.decay_dial,
+                        self.wetness_dial, self.delay_input, self.threshold_input, self.level_dial,
+                        self.gain_input):
+            control.valueChanged.connect(self.schedule_preview)
+
         main_widget.setLayout(main_layout)
         self.setCentralWidget(main_widget)
         main_layout.addLayout(main_layout_bottom)
@@ -294,9 +600,11 @@ class AudioGUI(QMainWindow):
 
     def at_action_graph(self):
         self.graphType = "A(t)"
+        self.show_graph(reset_view=True)
 
     def af_action_graph(self):
         self.graphType = "A(f)"
+        self.show_graph()
 
     def create_slider(self, label_text, layout):
         slider_layout = QVBoxLayout()
@@ -0,0 +1,152 @@
+import os
+from functools import cached_property
+
+import numpy as np
+
+from analysis_cache import file_key
+from waveform import PeakPyramid
+from spectrogram import Spectrogram
+from metering import measure_samples
+from sample_format import INT24, unpack_int24
+from wav_mmap import open_wav_memmap
+
+
+class AudioDocument:
+    """
+    One opened audio file, decoded once.
+
+    Holds the samples as a read-only memory-mapped (frames, channels) array
+    in the file's own sample format and the WAV parameters, so opening is
+    near-instant and pages are read only when plots or effects touch them.
+    24-bit files are the exception: they are unpacked to int32 once on open.
+
+    Derived data (levels, duration, spectrogram, waveform overview) is
+    computed on first use and kept, so the file table, both plot views and
+    the effect chain all share a single read of the file.
+
+    With an AnalysisCache, levels, the overview and the coarse spectrogram
+    tiles are loaded from it when the file was analysed before, and
+    save_analysis() stores them for the next time, so reopening a file does
+    not read its samples until the view zooms in.
+    """
+
+    # Spectrogram tiles fine enough for a full view this many columns wide are cached
+    CACHED_SPECTROGRAM_COLUMNS = 2000
+
+    def __init__(self, path, samples, info, cache=None):
+        self.path = path
+        self.samples = samples
+        self.info = info
+        self.cache = cache
+        self._cache_key = file_key(path) if cache is not None else None
+        self._cached = (cache.load(self._cache_key) or {}) if cache is not None else {}
+        self._levels = None
+
+    @classmethod
+    def open(cls, path, cache=None):
+        samples, info = open_wav_memmap(path)
+        if samples.dtype == INT24:
+            samples = unpack_int24(samples)
+        return cls(path, samples, info, cache)
+
+    @property
+    def file_name(self):
+        return os.path.basename(self.path)
+
+    @property
+    def file_size(self):
+        return os.path.getsize(self.path)
+
+    @property
+    def sample_rate(self):
+        return self.info.sample_rate
+
+    @property
+    def channels(self):
+        return self.info.channels
+
+    @property
+    def frames(self):
+        return len(self.samples)
+
+    @cached_property
+    def duration(self):
+        return self.frames / self.sample_rate
+
+    @property
+    def levels(self):
+        """Peak, true-peak, RMS and loudness, see metering.LoudnessMeter.levels."""
+        return self.measure_levels()
+
+    def measure_levels(self):
+        """
+        The levels, loaded from the analysis cache or measured in one pass
+        over the file, and kept for later calls.
+
+        Measuring takes seconds for long files and touches nothing but the
+        samples, so it can run on a background thread while the document is
+        in use (unlike a cached_property, which locks while computing).
+        """
+        levels = self._levels
+        if levels is None:
+            if 'level_names' in self._cached:
+                levels = dict(zip(self._cached['level_names'].tolist(), self._cached['level_values'].tolist()))
+            else:
+                levels = measure_samples(self.samples, self.sample_rate)
+            self._levels = levels
+        return levels
+
+    @cached_property
+    def spectrogram(self):
+        """Tiled short-time spectra, computed as the views ask for them."""
+        spectrogram = Spectrogram(self.samples, self.sample_rate)
+        tiles = {}
+        for name, tile in self._cached.items():
+            if name.startswith('tile_'):
+                level, index = map(int, name.split('_')[1:])
+                tiles[level, index] = tile.astype(np.float32)
+        spectrogram.add_tiles(tiles)
+        return spectrogram
+
+    @cached_property
+    def overview(self):
+        if 'pyramid_buckets' in self._cached:
+            try:
+                levels = [(int(bucket), self._cached[f'pyramid_mins_{i}'], self._cached[f'pyramid_maxs_{i}'])
+                          for i, bucket in enumerate(self._cached['pyramid_buckets'])]
+                return PeakPyramid.from_levels(self.samples, levels)
+            except KeyError:
+                # Incomplete entry: recompute and drop it
+                self._discard_cached()
+        return PeakPyramid(self.samples)
+
+    def _discard_cached(self):
+        self.cache.discard(self._cache_key)
+        self._cached = {}
+
+    def save_analysis(self):
+        """Store the derived data computed so far in the analysis cache, if there is anything new."""
+        if self.cache is None:
+            return
+
+        arrays = {}
+        levels = self._levels
+        if levels is not None:
+            arrays['level_names'] = np.array(list(levels))
+            arrays['level_values'] = np.array(list(levels.values()))
+        if 'overview' in self.__dict__:
+            arrays['pyramid_buckets'] = np.array([bucket for bucket, _, _ in self.overview.levels])
+            for i, (_, mins, maxs) in enumerate(self.overview.levels):
+                arrays[f'pyramid_mins_{i}'] = mins
+                arrays[f'pyramid_maxs_{i}'] = maxs
+        if 'spectrogram' in self.__dict__:
+            min_level = self.spectrogram.level_for(self.frames, self.CACHED_SPECTROGRAM_COLUMNS)
+            for (level, index), tile in self.spectrogram.cached_tiles(min_level).items():
+                # Half precision is plenty for dB values
+                arrays[f'tile_{level}_{index}'] = tile.astype(np.float16)
+
+        if arrays and not set(arrays) <= set(self._cached):
+            # Keep what was cached before but not used in this session
+            arrays = {**self._cached, **arrays}
+            self.cache.store(self._cache_key, arrays)
+            self._cached = arrays
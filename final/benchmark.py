@@ -0,0 +1,154 @@
+"""
+Benchmarks for the final/ effects.
+
+Runs apply_distortion, equalize, add_reverb, the full refresh_action
+chain and the loudness meter on synthetic signals, reports throughput as
+a multiple of real time and peak memory, and compares the results with a
+saved baseline.
+
+    python benchmark.py                      # quick grid, compare with baseline if present
+    python benchmark.py --full               # durations up to 1 h
+    python benchmark.py --save-baseline      # record the current numbers
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from chain import EffectChain, DistortionStage, EqualizerStage, EchoStage
+from distortion import apply_distortion
+from echo import add_reverb
+from equalizer import equalize
+from metering import measure_samples
+
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+
+QUICK_GRID = {'durations': [1, 10, 60], 'channels': [1, 2], 'sample_rates': [44100]}
+FULL_GRID = {'durations': [1, 10, 60, 600, 3600], 'channels': [1, 2], 'sample_rates': [44100, 48000]}
+
+
+def refresh_chain(samples, sample_rate):
+    # Same chain refresh_action builds, with typical settings
+    chain = EffectChain([
+        DistortionStage(-6, 50, 0),
+        EqualizerStage(120, 100, 80),
+        EchoStage(250, 0.5, 0.3),
+    ])
+    return chain.render(samples, sample_rate)
+
+
+EFFECTS = {
+    'distortion': lambda samples, sample_rate: apply_distortion(samples, -6, 50, 0),
+    'equalize': lambda samples, sample_rate: equalize(samples, sample_rate, 120, 100, 80),
+    'reverb': lambda samples, sample_rate: add_reverb(samples, 0.5, 0.5, 0.3, sample_rate),
+    'chain': refresh_chain,
+    'metering': measure_samples,
+}
+
+
+def synthetic_signal(duration, channels, sample_rate, seed=0):
+    """Tones plus noise as 16-bit PCM of shape (frames, channels)."""
+    rng = np.random.default_rng(seed)
+    frames = int(duration * sample_rate)
+    t = np.arange(frames, dtype=np.float32) / sample_rate
+    tones = 0.3 * np.sin(2 * np.pi * 110 * t) + 0.2 * np.sin(2 * np.pi * 1000 * t) + 0.1 * np.sin(2 * np.pi * 6000 * t)
+    signal = tones[:, None] + 0.05 * rng.standard_normal((frames, channels), dtype=np.float32)
+    return (signal * 32767).astype(np.int16)
+
+
+def measure(effect, samples, sample_rate, repeats):
+    """Best wall time over repeats and peak traced memory of one run."""
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        effect(samples, sample_rate)
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    effect(samples, sample_rate)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def case_key(effect, duration, channels, sample_rate):
+    return f"{effect}/{duration}s/{channels}ch/{sample_rate}Hz"
+
+
+def run(grid, effects, repeats):
+    results = {}
+    for sample_rate in grid['sample_rates']:
+        for channels in grid['channels']:
+            for duration in grid['durations']:
+                samples = synthetic_signal(duration, channels, sample_rate)
+                # Short signals are timed several times, long ones once
+                case_repeats = repeats if duration <= 60 else 1
+                for name in effects:
+                    elapsed, peak = measure(EFFECTS[name], samples, sample_rate, case_repeats)
+                    key = case_key(name, duration, channels, sample_rate)
+                    results[key] = {
+                        'realtime_factor': duration / elapsed,
+                        'seconds': elapsed,
+                        'peak_memory_mb': peak / 2 ** 20,
+                    }
+                    print(f"{key:32s} {duration / elapsed:10.1f}x real time {peak / 2 ** 20:10.1f} MB")
+                del samples
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Names of cases whose real-time factor fell more than threshold below the baseline."""
+    regressions = []
+    for key, result in results.items():
+        reference = baseline.get(key)
+        if reference is None:
+            continue
+        floor = reference['realtime_factor'] * (1 - threshold)
+        if result['realtime_factor'] < floor:
+            regressions.append(f"{key}: {result['realtime_factor']:.1f}x, baseline "
+                               f"{reference['realtime_factor']:.1f}x")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the final/ effects")
+    parser.add_argument('--full', action='store_true', help="durations up to 1 h and two sample rates")
+    parser.add_argument('--effects', nargs='+', choices=sorted(EFFECTS), default=list(EFFECTS))
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="baseline JSON file")
+    parser.add_argument('--save-baseline', action='store_true', help="write the results as the new baseline")
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help="allowed drop in real-time factor before failing (0.25 = 25%%)")
+    args = parser.parse_args(argv)
+
+    results = run(FULL_GRID if args.full else QUICK_GRID, args.effects, args.repeats)
+
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("No baseline to compare with, run with --save-baseline first")
+        return 0
+
+    with open(args.baseline) as f:
+        regressions = compare(results, json.load(f), args.threshold)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
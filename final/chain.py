@@ -0,0 +1,286 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from distortion import apply_distortion_float
+from equalizer import equalize_float, BiquadEqualizer
+from echo import FeedbackEcho
+from sample_format import to_float32, from_float32
+
+
+class RenderCancelled(Exception):
+    """Raised inside a render when its cancel check returns True."""
+
+
+class DistortionStage:
+    """Soft-clipping distortion, processed in place."""
+
+    def __init__(self, threshold_db=0, level=50, gain_db=0):
+        self.threshold_db = threshold_db
+        self.level = level
+        self.gain_db = gain_db
+
+    def key(self):
+        return ("distortion", self.threshold_db, self.level, self.gain_db)
+
+    def reset(self):
+        pass
+
+    def process(self, buffer, sample_rate):
+        return apply_distortion_float(buffer, self.threshold_db, self.level, self.gain_db)
+
+
+class EqualizerStage:
+    """
+    Three-band equalizer.
+
+    The "fft" engine equalizes the whole buffer at once, "iir" uses
+    BiquadEqualizer and keeps its state between calls for block streaming.
+    """
+
+    def __init__(self, treble=100, mid=100, bass=100, engine="fft"):
+        if engine not in ("fft", "iir"):
+            raise ValueError(f"Unknown equalizer engine: {engine}")
+        self.treble = treble
+        self.mid = mid
+        self.bass = bass
+        self.engine = engine
+        self.reset()
+
+    def key(self):
+        return ("equalizer", self.treble, self.mid, self.bass, self.engine)
+
+    def reset(self):
+        self._biquad = None
+
+    def process(self, buffer, sample_rate):
+        if self.engine == "fft":
+            return equalize_float(buffer, sample_rate, self.treble, self.mid, self.bass)
+
+        if self._biquad is None or self._biquad.sample_rate != sample_rate:
+            self._biquad = BiquadEqualizer(sample_rate, self.treble, self.mid, self.bass)
+        return self._biquad.process(buffer)
+
+
+class EchoStage:
+    """Feedback echo, processed in place; the delay line persists between calls."""
+
+    def __init__(self, delay_ms=0, feedback=0.0, wetness=0.0):
+        self.delay_ms = delay_ms
+        self.feedback = feedback
+        self.wetness = wetness
+        self.reset()
+
+    def key(self):
+        return ("echo", self.delay_ms, self.feedback, self.wetness)
+
+    def reset(self):
+        self._echo = None
+
+    def process(self, buffer, sample_rate):
+        if self._echo is None or self._echo.sample_rate != sample_rate:
+            self._echo = FeedbackEcho(sample_rate, self.delay_ms, self.feedback, self.wetness)
+        return self._echo.process(buffer)
+
+
+class ParallelStage:
+    """
+    Parallel branches (e.g. dry and wet) mixed back together.
+
+    Each branch is an EffectChain with a mix gain. Branches run at the same
+    time on a thread pool; numpy releases the GIL for the heavy work.
+    """
+
+    _pool = None
+
+    def __init__(self, branches):
+        """
+        Parameters:
+        branches (list): (EffectChain, gain) pairs; an empty chain is a dry path
+        """
+        self.branches = list(branches)
+
+    def key(self):
+        return ("parallel",) + tuple((chain.key(), gain) for chain, gain in self.branches)
+
+    def reset(self):
+        for chain, _ in self.branches:
+            chain.reset()
+
+    def process(self, buffer, sample_rate):
+        if ParallelStage._pool is None:
+            ParallelStage._pool = ThreadPoolExecutor()
+
+        # The last branch may work on the buffer itself, the others get copies
+        inputs = [buffer.copy() for _ in self.branches[:-1]] + [buffer]
+        futures = [
+            ParallelStage._pool.submit(chain.process, branch_input, sample_rate)
+            for (chain, _), branch_input in zip(self.branches, inputs)
+        ]
+
+        mixed = None
+        for future, (_, gain) in zip(futures, self.branches):
+            output = future.result()
+            output *= gain
+            if mixed is None:
+                mixed = output
+            else:
+                mixed += output
+        return mixed
+
+
+class EffectChain:
+    """
+    Ordered list of effect stages working on one float32 buffer.
+
+    Stages take a float32 buffer in [-1, 1] and return the processed buffer,
+    working in place where they can. PCM conversion happens only in render(),
+    once on the way in and once on the way out.
+    """
+
+    def __init__(self, stages=()):
+        self.stages = list(stages)
+
+    def add(self, stage):
+        self.stages.append(stage)
+        return self
+
+    def key(self):
+        return tuple(stage.key() for stage in self.stages)
+
+    def reset(self):
+        for stage in self.stages:
+            stage.reset()
+
+    def process(self, buffer, sample_rate):
+        """Run the float32 buffer through every stage, keeping stage state between calls."""
+        for stage in self.stages:
+            buffer = stage.process(buffer, sample_rate)
+        return buffer
+
+    def render(self, samples, sample_rate):
+        """
+        Render a whole signal from scratch.
+
+        Parameters:
+        samples (np.array): PCM in any sample_format dtype, 1-D or (frames, channels)
+        sample_rate (int): Sample rate in Hz
+
+        Returns:
+        np.array: Processed samples, same dtype as the input
+        """
+        self.reset()
+        return from_float32(self.process(to_float32(samples), sample_rate), np.asarray(samples).dtype)
+
+    def render_cached(self, samples, sample_rate, cache, source_key=None, progress=None, cancelled=None):
+        """
+        Render a whole signal, reusing cached stage outputs.
+
+        The output of every stage is cached under its input (the source and
+        all upstream stage parameters) and its own parameters, so changing
+        one stage only recomputes that stage and the ones after it.
+
+        Parameters:
+        samples (np.array): PCM in any sample_format dtype, 1-D or (frames,
+                            channels); not modified
+        sample_rate (int): Sample rate in Hz
+        cache (StageCache): Cache shared between renders
+        source_key (hashable): Identifies samples; hashed from the data if None
+        progress (callable): Called as progress(done_stages, total_stages)
+        cancelled (callable): Checked before every stage; when it returns True
+                              the render stops with RenderCancelled
+
+        Returns:
+        np.array: Processed samples, same dtype as the input
+        """
+        if source_key is None:
+            source_key = fingerprint(samples)
+
+        keys = []
+        key = (source_key, sample_rate)
+        for stage in self.stages:
+            key = key + (stage.key(),)
+            keys.append(key)
+
+        # Start after the last stage whose output is already cached
+        start = 0
+        buffer = None
+        for i in range(len(keys) - 1, -1, -1):
+            cached = cache.get(keys[i])
+            if cached is not None:
+                start = i + 1
+                buffer = cached.copy()
+                break
+        if buffer is None:
+            buffer = to_float32(samples)
+
+        for done, (stage, key) in enumerate(zip(self.stages[start:], keys[start:]), start):
+            if progress is not None:
+                progress(done, len(self.stages))
+            if cancelled is not None and cancelled():
+                raise RenderCancelled()
+            stage.reset()
+            buffer = stage.process(buffer, sample_rate)
+            cache.put(key, buffer)
+
+        if progress is not None:
+            progress(len(self.stages), len(self.stages))
+
+        return from_float32(buffer, np.asarray(samples).dtype)
+
+
+def fingerprint(samples):
+    """Content hash of a sample array, usable as a cache source key."""
+    samples = np.ascontiguousarray(samples)
+    digest = hashlib.blake2b(samples.view(np.uint8), digest_size=16)
+    return (samples.shape, str(samples.dtype), digest.hexdigest())
+
+
+class StageCache:
+    """
+    LRU cache of stage outputs with a memory cap.
+
+    Stored buffers are read-only copies; the least recently used entries are
+    evicted once the total size exceeds max_bytes.
+    """
+
+    def __init__(self, max_bytes=512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._entries = OrderedDict()
+        # Renders may run on a worker thread while the GUI clears the cache
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def get(self, key):
+        with self._lock:
+            buffer = self._entries.get(key)
+            if buffer is not None:
+                self._entries.move_to_end(key)
+            return buffer
+
+    def put(self, key, buffer):
+        if buffer.nbytes > self.max_bytes:
+            return
+        stored = buffer.copy()
+        stored.setflags(write=False)
+
+        with self._lock:
+            if key in self._entries:
+                self.nbytes -= self._entries.pop(key).nbytes
+            self._entries[key] = stored
+            self.nbytes += stored.nbytes
+
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.nbytes -= evicted.nbytes
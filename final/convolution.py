@@ -0,0 +1,200 @@
+import os
+from functools import lru_cache
+
+import numpy as np
+from scipy.io import wavfile
+
+from resample import resample
+from sample_format import to_float32
+
+
+def _unit_energy(ir):
+    energy = np.sqrt(np.sum(ir.astype(np.float64) ** 2))
+    if energy > 0:
+        ir = ir / energy
+    return ir.astype(np.float32)
+
+
+@lru_cache(maxsize=8)
+def _load_ir(path, mtime):
+    sample_rate, ir = wavfile.read(path)
+    ir = to_float32(ir)
+
+    # Mono IR, applied to every channel of the input
+    if ir.ndim == 2:
+        ir = ir.mean(axis=1)
+
+    # Normalize to unit energy so the wet level does not depend on IR length
+    ir = _unit_energy(ir)
+    ir.setflags(write=False)
+    return sample_rate, ir
+
+
+def load_impulse_response(path):
+    """
+    Load an impulse response WAV file.
+
+    Results are cached per path and modification time.
+
+    Returns:
+    tuple: (sample_rate, read-only float32 mono impulse response)
+    """
+    path = os.path.abspath(path)
+    return _load_ir(path, os.path.getmtime(path))
+
+
+def _partition_spectra(ir, block_size):
+    n_parts = max(1, -(-len(ir) // block_size))
+    parts = np.zeros((n_parts, 2 * block_size), dtype=np.float32)
+    # Each row holds one block_size slice of the IR, zero padded to 2 * block_size
+    parts[:, :block_size] = np.pad(ir, (0, n_parts * block_size - len(ir))).reshape(n_parts, block_size)
+    return np.fft.rfft(parts, axis=1).astype(np.complex64)
+
+
+@lru_cache(maxsize=8)
+def _cached_spectra(path, mtime, block_size, sample_rate=None):
+    ir_rate, ir = _load_ir(path, mtime)
+    if sample_rate is not None and sample_rate != ir_rate:
+        ir = _unit_energy(resample(ir, ir_rate, sample_rate))
+    spectra = _partition_spectra(ir, block_size)
+    spectra.setflags(write=False)
+    return spectra
+
+
+class ConvolutionReverb:
+    """
+    Convolution reverb using uniformly partitioned FFT convolution.
+
+    The impulse response is split into block_size partitions whose spectra
+    are cached after the first load. Every block of input costs one FFT of
+    size 2 * block_size plus one complex multiply-add per partition, so the
+    cost grows as O(N log B) instead of O(N * IR length).
+
+    Blocks of any size can be passed to process(); the output then lags the
+    input by `latency` samples and flush() returns the remainder.
+    """
+
+    def __init__(self, impulse_response, block_size=1024, wetness=0.5, sample_rate=None):
+        """
+        Parameters:
+        impulse_response (str or np.array): IR WAV path or float samples;
+                                            both are normalized to unit energy
+        block_size (int): Partition size in samples
+        wetness (float): Wet/dry mix ratio (0-1.0)
+        sample_rate (int): Sample rate of the input; an IR file recorded at
+                           another rate is resampled to it once and cached
+        """
+        if isinstance(impulse_response, (str, os.PathLike)):
+            path = os.path.abspath(impulse_response)
+            self.spectra = _cached_spectra(path, os.path.getmtime(path), block_size, sample_rate)
+        else:
+            # Same normalization as a loaded file, so wetness means the same for both
+            ir = _unit_energy(np.asarray(impulse_response, dtype=np.float32))
+            self.spectra = _partition_spectra(ir, block_size)
+
+        self.block_size = block_size
+        self.latency = block_size
+        self.wetness = float(np.clip(wetness, 0, 1.0))
+        self.reset()
+
+    def reset(self):
+        self._fdl = None
+        self._fdl_pos = 0
+        self._prev = None
+        self._pending = None
+        self._queue = None
+
+    def _process_partition(self, x):
+        """Convolve exactly block_size samples (overlap-save)."""
+        n_parts = len(self.spectra)
+        if self._fdl is None:
+            channels = x.shape[1:]
+            self._fdl = np.zeros((n_parts, self.block_size + 1) + channels, dtype=np.complex64)
+            self._prev = np.zeros((self.block_size,) + channels, dtype=np.float32)
+
+        # Frequency-domain delay line as a ring buffer of input spectra
+        self._fdl_pos = (self._fdl_pos + 1) % n_parts
+        self._fdl[self._fdl_pos] = np.fft.rfft(np.concatenate([self._prev, x]), axis=0)
+        self._prev = x
+
+        order = (self._fdl_pos - np.arange(n_parts)) % n_parts
+        spectra = self.spectra.reshape(self.spectra.shape + (1,) * (x.ndim - 1))
+        acc = np.sum(self._fdl[order] * spectra, axis=0)
+        wet = np.fft.irfft(acc, axis=0)[self.block_size:]
+
+        return (1 - self.wetness) * x + self.wetness * wet
+
+    def process(self, block):
+        """
+        Process the next block of samples.
+
+        Parameters:
+        block (np.array): Input samples, 1-D or (frames, channels)
+
+        Returns:
+        np.array: len(block) output samples delayed by `latency`; int16 for
+                  integer input, float32 otherwise
+        """
+        block = np.asarray(block)
+        x = block.astype(np.float32)
+        self._dtype = block.dtype
+        if self._pending is None:
+            self._pending = x[:0]
+            self._queue = np.zeros((self.latency,) + x.shape[1:], dtype=np.float32)
+
+        pending = np.concatenate([self._pending, x])
+        n_full = len(pending) // self.block_size * self.block_size
+        outputs = [self._queue]
+        for start in range(0, n_full, self.block_size):
+            outputs.append(self._process_partition(pending[start:start + self.block_size]))
+        self._pending = pending[n_full:]
+
+        queue = np.concatenate(outputs)
+        self._queue = queue[len(block):]
+        return self._output(queue[:len(block)], block.dtype)
+
+    def flush(self):
+        """Return the last `latency` output samples of the stream."""
+        if self._pending is None:
+            return np.zeros(0, dtype=np.float32)
+        padding = np.zeros((self.block_size - len(self._pending),) + self._pending.shape[1:], dtype=np.float32)
+        tail = self._process_partition(np.concatenate([self._pending, padding]))
+        out = np.concatenate([self._queue, tail])[:self.latency]
+        dtype = self._dtype
+        self.reset()
+        return self._output(out, dtype)
+
+    @staticmethod
+    def _output(samples, dtype):
+        if np.issubdtype(dtype, np.integer):
+            return np.clip(samples, -32768, 32767).astype(np.int16)
+        return samples
+
+
+def convolution_reverb(audio, impulse_response, wetness=0.5, block_size=1024, sample_rate=None):
+    """
+    Apply convolution reverb to a whole signal.
+
+    Parameters:
+    audio (numpy.ndarray): Input audio signal, 1-D or (frames, channels)
+    impulse_response (str or np.array): IR WAV path or float samples
+    wetness (float): Wet/dry mix ratio (0-1.0)
+    block_size (int): Partition size in samples
+    sample_rate (int): Sample rate of the audio, the IR file is resampled to it
+
+    Returns:
+    numpy.ndarray: Processed audio signal of the same length (int16 for
+                   integer input)
+    """
+    audio = np.asarray(audio)
+    reverb = ConvolutionReverb(impulse_response, block_size, wetness, sample_rate)
+
+    x = audio.astype(np.float32)
+    n_blocks = -(-len(x) // block_size)
+    x = np.concatenate([x, np.zeros((n_blocks * block_size - len(x),) + x.shape[1:], dtype=np.float32)])
+
+    out = np.empty_like(x)
+    for start in range(0, len(x), block_size):
+        out[start:start + block_size] = reverb._process_partition(x[start:start + block_size])
+
+    return reverb._output(out[:len(audio)], audio.dtype)
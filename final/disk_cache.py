@@ -0,0 +1,71 @@
+import os
+import tempfile
+
+
+class DiskCache:
+    """
+    Directory of cache files, one per key, with least-recently-used eviction.
+
+    Subclasses decide what an entry holds: store_entry() writes one
+    atomically and touch() marks one as used. When the entries grow past
+    max_bytes, the ones used longest ago are deleted.
+    """
+
+    # File name extension of the entries; other files in the directory are left alone
+    SUFFIX = '.cache'
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def _entry_path(self, key):
+        return os.path.join(self.directory, key + self.SUFFIX)
+
+    def store_entry(self, key, write):
+        """Create the entry under key with write(binary file), replacing any older one, then evict."""
+        os.makedirs(self.directory, exist_ok=True)
+        # Write to a temporary file first, so readers never see half an entry
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                write(f)
+            os.replace(temp_path, self._entry_path(key))
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        self.evict()
+
+    def touch(self, key):
+        """Mark the entry under key as just used."""
+        os.utime(self._entry_path(key))
+
+    def discard(self, key):
+        """Delete the entry under key, if there is one."""
+        try:
+            os.unlink(self._entry_path(key))
+        except OSError:
+            pass
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits in max_bytes."""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(self.SUFFIX):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            total -= size
+
+    def clear(self):
+        if os.path.isdir(self.directory):
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith(self.SUFFIX):
+                    os.unlink(entry.path)
@@ -1,12 +1,33 @@
+from functools import lru_cache
+
 import numpy as np
 
 
+@lru_cache(maxsize=16)
+def distortion_table(threshold_db=0, level=50, gain_db=0):
+    """
+    Output of apply_distortion for every possible 16-bit input sample.
+
+    The table is indexed by the sample's bit pattern read as uint16 and is
+    cached per (threshold_db, level, gain_db).
+
+    Returns:
+    np.array: Read-only int16 table of 65536 entries
+    """
+    values = np.arange(65536, dtype=np.uint16).view(np.int16)
+    table = _distort_pcm(values, threshold_db, level, gain_db)
+
+    table.setflags(write=False)
+    return table
+
+
 def apply_distortion(samples, threshold_db=0, level=50, gain_db=0):
     """
     Apply distortion effect to audio samples.
 
     Parameters:
-    samples (np.array): Input audio data as numpy array (16-bit PCM)
+    samples (np.array): Input audio data as numpy array (16-bit PCM),
+                        1-D or (frames, channels)
     threshold_db (int): Threshold in dB where distortion begins (-50 to 50)
     level (int): Distortion intensity from dial (0 to 100)
     gain_db (int): Output gain in dB (-50 to 50)
@@ -14,9 +35,34 @@ def apply_distortion(samples, threshold_db=0, level=50, gain_db=0):
     Returns:
     np.array: Processed audio samples
     """
+    samples = np.asarray(samples)
+
+    # 16-bit input: the output depends only on the sample value, so look it up
+    if samples.dtype == np.int16:
+        return distortion_table(threshold_db, level, gain_db)[samples.view(np.uint16)]
+
+    return _distort_pcm(samples, threshold_db, level, gain_db)
+
+
+def _distort_pcm(samples, threshold_db, level, gain_db):
     # Convert to float32 and normalize to [-1, 1]
-    samples = samples.astype(np.float32) / 32768.0
+    processed = samples.astype(np.float32) / 32768.0
 
+    apply_distortion_float(processed, threshold_db, level, gain_db)
+
+    # Convert back to 16-bit PCM range
+    return (processed * 32768.0).astype(np.int16)
+
+
+def apply_distortion_float(buffer, threshold_db=0, level=50, gain_db=0):
+    """
+    Apply distortion in place to float32 samples normalized to [-1, 1].
+
+    Parameters are the same as for apply_distortion.
+
+    Returns:
+    np.array: The same buffer, processed
+    """
     # Convert threshold from dB to linear amplitude
     threshold = 10 ** (threshold_db / 20.0)
     # Normalize threshold to [0, 1] range
@@ -28,26 +74,24 @@ def apply_distortion(samples, threshold_db=0, level=50, gain_db=0):
     # Convert gain from dB to linear multiplier
     gain_linear = 10 ** (gain_db / 20.0)
 
-    # Create a copy for processing
-    processed = samples.copy()
-
     # Apply distortion
-    mask = np.abs(processed) > threshold
+    mask = np.abs(buffer) > threshold
     if np.any(mask):
+        exceeding = buffer[mask]
+
         # Calculate distortion only where signal exceeds threshold
-        excess = np.abs(processed[mask]) - threshold
+        excess = np.abs(exceeding) - threshold
 
         # Apply soft clipping curve based on level
         curve = threshold + (1.0 - threshold) * (1.0 - np.exp(-level * excess))
 
         # Preserve original signal sign
-        processed[mask] = np.sign(processed[mask]) * curve
+        buffer[mask] = np.sign(exceeding) * curve
 
     # Apply gain
-    processed *= gain_linear
+    buffer *= gain_linear
 
     # Hard clip to prevent overflow
-    processed = np.clip(processed, -1.0, 1.0)
+    np.clip(buffer, -1.0, 1.0, out=buffer)
 
-    # Convert back to 16-bit PCM range
-    return (processed * 32768.0).astype(np.int16)
\ No newline at end of file
+    return buffer
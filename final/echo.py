@@ -1,15 +1,17 @@
 import numpy as np
+from scipy.signal import lfilter
 
 
-def add_reverb(audio_data, delay_ms, decay, wetness):
+def add_reverb(audio_data, delay_ms, decay, wetness, sample_rate):
     """
     Apply a simple reverb effect to audio data using delay lines.
 
     Parameters:
-    audio_data (numpy.ndarray): Input audio signal
+    audio_data (numpy.ndarray): Input audio signal, 1-D or (frames, channels)
     delay_ms (float): Delay time in milliseconds (0-100ms)
     decay (float): Decay factor (0.1-1.0)
     wetness (float): Wet/dry mix ratio (0-1.0)
+    sample_rate (int): Sample rate of audio_data in Hz
 
     Returns:
     numpy.ndarray: Processed audio signal
@@ -19,8 +21,7 @@ def add_reverb(audio_data, delay_ms, decay, wetness):
     decay = np.clip(decay, 0.1, 1.0)
     wetness = np.clip(wetness, 0, 1.0)
 
-    # Convert delay to samples (assuming 44100 Hz sample rate)
-    sample_rate = 44100
+    # Convert delay to samples
     delay_samples = int((delay_ms / 1000.0) * sample_rate)
 
     # Create output buffer
@@ -64,4 +65,103 @@ def add_reverb(audio_data, delay_ms, decay, wetness):
         mixed = mixed / np.max(np.abs(mixed)) * np.max(np.abs(audio_float))
 
     # Convert back to int16
-    return mixed.astype(np.int16)
\ No newline at end of file
+    return mixed.astype(np.int16)
+
+
+class FeedbackEcho:
+    """
+    Feedback echo built as a recursive comb filter, y[n] = x[n] + feedback * y[n - D].
+
+    The delay line is a ring buffer that persists between process() calls,
+    so audio can be streamed in blocks. Each pass handles up to D samples
+    with array operations, so the cost is linear in the signal length
+    whatever the delay or the number of audible repeats.
+    """
+
+    # Below this many samples of delay (under 1 ms) the ring loop would
+    # iterate too often, so the comb is run through lfilter instead. Its cost
+    # grows with the delay, and this is about where the ring loop gets
+    # faster, so both paths stay linear with a bounded constant
+    SHORT_DELAY = 40
+
+    def __init__(self, sample_rate, delay_ms, feedback, wetness):
+        """
+        Parameters:
+        sample_rate (int): Sample rate of the audio in Hz
+        delay_ms (float): Delay between repeats in milliseconds (0-5000ms)
+        feedback (float): Level of each repeat relative to the previous one (0-0.99)
+        wetness (float): Level of the repeats added to the dry signal (0-1.0)
+        """
+        self.sample_rate = sample_rate
+        self.delay = int(round(max(delay_ms, 0) / 1000.0 * sample_rate))
+        self.feedback = float(np.clip(feedback, 0, 0.99))
+        self.wetness = float(np.clip(wetness, 0, 1.0))
+        self.reset()
+
+    def reset(self):
+        self._line = None
+        self._pos = 0
+
+    def _comb(self, x):
+        if self._line is None:
+            self._line = np.zeros((self.delay,) + x.shape[1:], dtype=np.float32)
+
+        if self.delay < self.SHORT_DELAY:
+            a = np.zeros(self.delay + 1)
+            a[0] = 1.0
+            a[-1] = -self.feedback
+            y, self._line = lfilter([1.0], a, x, axis=0, zi=self._line)
+            return y.astype(np.float32)
+
+        y = np.empty_like(x)
+        line = self._line
+        pos = self._pos
+        i = 0
+        while i < len(x):
+            take = min(len(x) - i, self.delay - pos)
+            segment = x[i:i + take] + self.feedback * line[pos:pos + take]
+            line[pos:pos + take] = segment
+            y[i:i + take] = segment
+            pos = (pos + take) % self.delay
+            i += take
+        self._pos = pos
+        return y
+
+    def process(self, block):
+        """
+        Process the next block of samples.
+
+        Parameters:
+        block (np.array): Input samples, 1-D or (frames, channels)
+
+        Returns:
+        np.array: Processed samples, int16 for integer input, float32 otherwise
+                  (float32 input is processed in place)
+        """
+        block = np.asarray(block)
+        x = np.asarray(block, dtype=np.float32)
+
+        if self.delay > 0 and self.feedback > 0 and self.wetness > 0:
+            y = self._comb(x)
+            x += self.wetness * (y - x)
+
+        if np.issubdtype(block.dtype, np.integer):
+            return np.clip(x, -32768, 32767).astype(np.int16)
+        return x
+
+
+def add_echo(audio_data, sample_rate, delay_ms, feedback, wetness):
+    """
+    Apply a feedback echo to audio data.
+
+    Parameters:
+    audio_data (numpy.ndarray): Input audio signal, 1-D or (frames, channels)
+    sample_rate (int): Sample rate of the audio in Hz
+    delay_ms (float): Delay between repeats in milliseconds (0-5000ms)
+    feedback (float): Level of each repeat relative to the previous one (0-0.99)
+    wetness (float): Level of the repeats added to the dry signal (0-1.0)
+
+    Returns:
+    numpy.ndarray: Processed audio signal
+    """
+    return FeedbackEcho(sample_rate, delay_ms, feedback, wetness).process(audio_data)
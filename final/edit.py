@@ -0,0 +1,317 @@
+import bisect
+import itertools
+
+import numpy as np
+
+
+# Frames per block for new audio, e.g. the output of an effect
+BLOCK_FRAMES = 65536
+
+_revisions = itertools.count(1)
+
+
+class Piece:
+    """Frames start..stop of an immutable block."""
+
+    __slots__ = ('block', 'start', 'stop')
+
+    def __init__(self, block, start, stop):
+        self.block = block
+        self.start = start
+        self.stop = stop
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def split(self, offset):
+        """The two pieces before and after offset frames into this one."""
+        middle = self.start + offset
+        return Piece(self.block, self.start, middle), Piece(self.block, middle, self.stop)
+
+    def samples(self):
+        return self.block[self.start:self.stop]
+
+
+def _frozen(samples):
+    view = samples.view()
+    view.setflags(write=False)
+    return view
+
+
+def make_pieces(samples, block_frames=BLOCK_FRAMES):
+    """Split samples into read-only pieces of block_frames frames (no copy)."""
+    block = _frozen(np.asarray(samples))
+    return [Piece(block, start, min(start + block_frames, len(block)))
+            for start in range(0, len(block), block_frames)]
+
+
+class Clip:
+    """Audio taken out of an EditBuffer: its pieces, sharing their blocks."""
+
+    def __init__(self, pieces):
+        self.pieces = pieces
+        self.frames = sum(len(piece) for piece in pieces)
+
+    def samples(self):
+        return np.concatenate([piece.samples() for piece in self.pieces])
+
+
+class _Splice:
+    """Pieces index..index + len(removed) were replaced by inserted."""
+
+    __slots__ = ('index', 'removed', 'inserted')
+
+    def __init__(self, index, removed, inserted):
+        self.index = index
+        self.removed = removed
+        self.inserted = inserted
+
+
+def _pieces_between(pieces, offsets, start, stop):
+    """Pieces covering start..stop exactly, splitting the ones at the ends."""
+    first = bisect.bisect_right(offsets, start) - 1
+    between = []
+    for i in range(max(first, 0), len(pieces)):
+        offset = offsets[i]
+        if offset >= stop:
+            break
+        piece = pieces[i]
+        if start > offset:
+            piece = piece.split(start - offset)[1]
+            offset = start
+        if stop < offset + len(piece):
+            piece = piece.split(stop - offset)[0]
+        between.append(piece)
+    return between
+
+
+class Snapshot:
+    """
+    Read-only, array-like view of an EditBuffer at one revision.
+
+    Holds its own copy of the piece list, so later edits do not change it
+    and another thread (playback, a render) can read it while the buffer is
+    being edited. Slicing reads only the requested frames, so code written
+    for (frames, channels) arrays, like the spectrogram or the player, works
+    on the edited audio without the whole file being copied; np.asarray()
+    materializes it.
+    """
+
+    ndim = 2
+
+    def __init__(self, pieces, channels, dtype):
+        self._pieces = pieces
+        self._offsets = np.concatenate([[0], np.cumsum([len(piece) for piece in pieces], dtype=np.int64)]).tolist()
+        self.channels = channels
+        self.dtype = dtype
+
+    @property
+    def frames(self):
+        return self._offsets[-1]
+
+    @property
+    def shape(self):
+        return (self.frames, self.channels)
+
+    def __len__(self):
+        return self.frames
+
+    def pieces_between(self, start, stop):
+        """(position, piece) of the pieces covering frames start..stop, split at the ends."""
+        start = int(np.clip(start, 0, self.frames))
+        stop = int(np.clip(stop, start, self.frames))
+        pieces = _pieces_between(self._pieces, self._offsets, start, stop)
+        positions = np.concatenate([[start], np.cumsum([len(piece) for piece in pieces], dtype=np.int64)[:-1] + start])
+        return list(zip(positions.tolist(), pieces))
+
+    def read(self, start, stop):
+        """Copy of frames start..stop as one array."""
+        pieces = [piece for _, piece in self.pieces_between(start, stop)]
+        if not pieces:
+            return np.zeros((0, self.channels), dtype=self.dtype)
+        return np.concatenate([piece.samples() for piece in pieces])
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice) or key.step not in (None, 1):
+            raise TypeError("Snapshot supports only contiguous slices")
+        start, stop, _ = key.indices(self.frames)
+        return self.read(start, stop)
+
+    def __array__(self, dtype=None, copy=None):
+        samples = self.read(0, self.frames)
+        return samples if dtype is None else samples.astype(dtype)
+
+
+class EditBuffer:
+    """
+    Piece table of audio blocks with undo and redo.
+
+    The audio is a sequence of pieces, each a frame range of an immutable
+    block. The original samples (typically a read-only memory map) are the
+    first blocks and are never copied. Cut, copy, paste and trim only
+    rearrange pieces; replacing a range, e.g. with the output of an effect,
+    adds new blocks for that range alone. Every edit is recorded as the
+    splices it made to the piece list, so undo and redo swap back only the
+    pieces that changed and a history step costs memory only for the new
+    blocks it created.
+    """
+
+    def __init__(self, samples, block_frames=BLOCK_FRAMES, channels=None):
+        """
+        Parameters:
+        samples (np.array): Original audio, (frames, channels) or 1-D for mono
+        block_frames (int): Frames per block for new audio
+        channels (int): Channel count, taken from the shape of samples if None
+        """
+        samples = np.asarray(samples)
+        if channels is None:
+            channels = samples.shape[1] if samples.ndim == 2 else 1
+        # Explicit channel count, so an empty file keeps its shape
+        samples = samples.reshape(-1, channels)
+        self.channels = channels
+        self.dtype = samples.dtype
+        self.block_frames = block_frames
+        self._pieces = make_pieces(samples, block_frames)
+        self._update_offsets()
+        self._undo = []
+        self._redo = []
+        # Identifies the content: 0 is the original, every edit gets a new id
+        self.revision = 0
+
+    def _update_offsets(self):
+        lengths = [len(piece) for piece in self._pieces]
+        self._offsets = np.concatenate([[0], np.cumsum(lengths, dtype=np.int64)]).tolist()
+
+    @property
+    def frames(self):
+        return self._offsets[-1]
+
+    @property
+    def pieces(self):
+        return list(self._pieces)
+
+    def _clamp(self, start, stop):
+        start = int(np.clip(start, 0, self.frames))
+        stop = int(np.clip(stop, start, self.frames))
+        return start, stop
+
+    def _pieces_between(self, start, stop):
+        return _pieces_between(self._pieces, self._offsets, start, stop)
+
+    def read(self, start, stop):
+        """Copy of frames start..stop as one array."""
+        start, stop = self._clamp(start, stop)
+        pieces = self._pieces_between(start, stop)
+        if not pieces:
+            return np.zeros((0, self.channels), dtype=self.dtype)
+        return np.concatenate([piece.samples() for piece in pieces])
+
+    def to_array(self):
+        return self.read(0, self.frames)
+
+    def snapshot(self, start=0, stop=None):
+        """Snapshot of frames start..stop (all by default); costs O(pieces), copies no samples."""
+        start, stop = self._clamp(start, self.frames if stop is None else stop)
+        return Snapshot(self._pieces_between(start, stop), self.channels, self.dtype)
+
+    def _splice(self, start, stop, inserted):
+        """Replace frames start..stop with the inserted pieces; returns the _Splice."""
+        first = max(bisect.bisect_right(self._offsets, start) - 1, 0)
+        last = first
+        while last < len(self._pieces) and self._offsets[last] < max(stop, start + 1):
+            last += 1
+        if start == stop and first < len(self._pieces) and self._offsets[first] == start:
+            # Pure insert at a piece boundary: nothing to remove
+            last = first
+
+        removed = self._pieces[first:last]
+        replacement = []
+        if removed and start > self._offsets[first]:
+            replacement.append(removed[0].split(start - self._offsets[first])[0])
+        replacement.extend(inserted)
+        if removed and stop < self._offsets[last]:
+            tail = removed[-1]
+            replacement.append(tail.split(len(tail) - (self._offsets[last] - stop))[1])
+
+        splice = _Splice(first, removed, [piece for piece in replacement if len(piece)])
+        self._apply(splice.index, splice.removed, splice.inserted)
+        return splice
+
+    def _apply(self, index, old, new):
+        self._pieces[index:index + len(old)] = new
+        self._update_offsets()
+
+    def _commit(self, splices):
+        self._undo.append((self.revision, splices))
+        self._redo.clear()
+        self.revision = next(_revisions)
+
+    def copy(self, start, stop):
+        """Clip of frames start..stop; shares the blocks, copies nothing."""
+        start, stop = self._clamp(start, stop)
+        return Clip(self._pieces_between(start, stop))
+
+    def cut(self, start, stop):
+        clip = self.copy(start, stop)
+        self.delete(start, stop)
+        return clip
+
+    def delete(self, start, stop):
+        start, stop = self._clamp(start, stop)
+        if stop > start:
+            self._commit([self._splice(start, stop, [])])
+
+    def paste(self, position, clip, replace_stop=None):
+        """Insert clip at position, replacing frames position..replace_stop if given."""
+        position, stop = self._clamp(position, position if replace_stop is None else replace_stop)
+        if clip.frames or stop > position:
+            self._commit([self._splice(position, stop, list(clip.pieces))])
+
+    def trim(self, start, stop):
+        """Keep only frames start..stop."""
+        start, stop = self._clamp(start, stop)
+        splices = []
+        if stop < self.frames:
+            splices.append(self._splice(stop, self.frames, []))
+        if start > 0:
+            splices.append(self._splice(0, start, []))
+        if splices:
+            self._commit(splices)
+
+    def replace(self, start, stop, samples):
+        """Replace frames start..stop with new samples, stored as new blocks."""
+        samples = np.asarray(samples, dtype=self.dtype).reshape(-1, self.channels)
+        self.paste(start, Clip(make_pieces(samples.copy(), self.block_frames)), stop)
+
+    def apply(self, start, stop, function):
+        """Replace frames start..stop with function(samples of that range)."""
+        start, stop = self._clamp(start, stop)
+        self.replace(start, stop, function(self.read(start, stop)))
+
+    @property
+    def can_undo(self):
+        return bool(self._undo)
+
+    @property
+    def can_redo(self):
+        return bool(self._redo)
+
+    def undo(self):
+        if not self._undo:
+            return False
+        revision, splices = self._undo.pop()
+        for splice in reversed(splices):
+            self._apply(splice.index, splice.inserted, splice.removed)
+        self._redo.append((self.revision, splices))
+        self.revision = revision
+        return True
+
+    def redo(self):
+        if not self._redo:
+            return False
+        revision, splices = self._redo.pop()
+        for splice in splices:
+            self._apply(splice.index, splice.removed, splice.inserted)
+        self._undo.append((self.revision, splices))
+        self.revision = revision
+        return True
@@ -1,27 +1,271 @@
+from functools import lru_cache
+
 import numpy as np
+from scipy.signal import sosfilt
+
+
+# Band edges in Hz
+BASS_CUTOFF = 250
+TREBLE_CUTOFF = 4000
+
+
+@lru_cache(maxsize=32)
+def band_bins(length, sample_rate):
+    """
+    First rfft bins of the mid and treble bands for a transform of the
+    given length. Only two integers are cached per length.
+    """
+    freqs = np.fft.rfftfreq(length, 1 / sample_rate)
+    return int(np.searchsorted(freqs, BASS_CUTOFF)), int(np.searchsorted(freqs, TREBLE_CUTOFF))
+
+
+@lru_cache(maxsize=32)
+def gain_curve(length, sample_rate, treble, mid, bass):
+    """
+    Build the per-bin gain vector for an rfft of the given length.
+
+    Curves are cached by (length, sample_rate, treble, mid, bass) with LRU
+    eviction. They are meant for short transforms such as FIR kernels;
+    equalize scales the bands of a whole signal in place instead, so no
+    signal-length curve is ever cached.
+
+    Returns:
+    np.array: Read-only float32 array of length // 2 + 1 gains
+    """
+    mid_bin, treble_bin = band_bins(length, sample_rate)
+
+    curve = np.full(length // 2 + 1, treble / 100, dtype=np.float32)
+    curve[:treble_bin] = mid / 100
+    curve[:mid_bin] = bass / 100
+
+    # Shared between callers through the cache
+    curve.setflags(write=False)
+    return curve
+
+
+def _per_frame(values, audio):
+    """Reshape a per-frame vector so it broadcasts over (frames, channels)."""
+    return values.reshape((-1,) + (1,) * (audio.ndim - 1))
 
 
 def equalize(audio, sample_rate, treble, mid, bass):
+    processed = equalize_float(audio, sample_rate, treble, mid, bass)
+
+    # Clip to prevent overflow
+    processed = np.clip(processed, -32768, 32767)
+
+    return processed.astype(np.int16)
+
+
+def equalize_float(audio, sample_rate, treble, mid, bass):
+    """
+    Equalize float samples without clipping or integer conversion.
+
+    Returns:
+    np.array: New float32 array, same shape as audio
+    """
     # Ensure input is numpy array of float32
     audio = np.asarray(audio, dtype=np.float32)
 
-    # Compute FFT
-    fft = np.fft.rfft(audio)
-    freqs = np.fft.rfftfreq(len(audio), 1 / sample_rate)
+    # Compute FFT of every channel at once (frames along axis 0)
+    fft = np.fft.rfft(audio, axis=0)
 
-    # Apply frequency-specific gains
-    for i, freq in enumerate(freqs):
-        if freq < 250:  # Bass
-            fft[i] *= bass / 100
-        elif 250 <= freq < 4000:  # Mid
-            fft[i] *= mid / 100
-        else:  # Treble
-            fft[i] *= treble / 100
+    # Apply frequency-specific gains, one slice of bins per band
+    mid_bin, treble_bin = band_bins(len(audio), sample_rate)
+    fft[:mid_bin] *= np.float32(bass / 100)
+    fft[mid_bin:treble_bin] *= np.float32(mid / 100)
+    fft[treble_bin:] *= np.float32(treble / 100)
 
     # Inverse FFT
-    processed = np.fft.irfft(fft)
+    return np.fft.irfft(fft, n=len(audio), axis=0).astype(np.float32, copy=False)
 
-    # Clip to prevent overflow
-    processed = np.clip(processed, -32768, 32767)
 
-    return processed.astype(np.int16)
\ No newline at end of file
+@lru_cache(maxsize=32)
+def band_kernel(taps, sample_rate, treble, mid, bass):
+    """
+    Design a linear-phase FIR filter with the same band gains as equalize.
+
+    The gain curve is sampled on a taps-point grid, turned into an impulse
+    response, centred and windowed. Kernels are cached like gain curves.
+
+    Returns:
+    np.array: Read-only float32 kernel of odd length taps
+    """
+    kernel = np.fft.irfft(gain_curve(taps, sample_rate, treble, mid, bass), n=taps)
+    kernel = np.roll(kernel, taps // 2) * np.blackman(taps)
+    kernel = kernel.astype(np.float32)
+
+    kernel.setflags(write=False)
+    return kernel
+
+
+def _rechunk(blocks, block_size):
+    """Regroup an iterable of sample blocks into blocks of block_size samples."""
+    pending = []
+    pending_len = 0
+    for block in blocks:
+        block = np.asarray(block)
+        while len(block):
+            take = min(block_size - pending_len, len(block))
+            pending.append(block[:take])
+            pending_len += take
+            block = block[take:]
+            if pending_len == block_size:
+                yield np.concatenate(pending)
+                pending = []
+                pending_len = 0
+    if pending_len:
+        yield np.concatenate(pending)
+
+
+def equalize_stream(blocks, sample_rate, treble, mid, bass, block_size=8192, taps=2047):
+    """
+    Equalize a stream of audio blocks with overlap-add FFT convolution.
+
+    Uses the same bands as equalize, applied through band_kernel, so memory
+    stays bounded by block_size + taps regardless of the stream length.
+
+    Parameters:
+    blocks (iterable): Input audio blocks (any sizes, e.g. from a generator),
+                       1-D or (frames, channels)
+    sample_rate (int): Sample rate in Hz
+    treble, mid, bass (int): Band gains in percent (50 to 150)
+    block_size (int): Number of samples processed per FFT
+    taps (int): FIR length, must be odd
+
+    Yields:
+    np.array: Processed int16 blocks, in total as long as the input
+    """
+    if taps % 2 == 0:
+        raise ValueError("taps must be odd")
+
+    kernel = band_kernel(taps, sample_rate, treble, mid, bass)
+    n_fft = 1 << (block_size + taps - 2).bit_length()
+    kernel_fft = np.fft.rfft(kernel, n_fft)
+    tail = None
+
+    # The kernel is centred, so drop its group delay from the output start
+    skip = taps // 2
+    total_in = 0
+    total_out = 0
+
+    for chunk in _rechunk(blocks, block_size):
+        n = len(chunk)
+        total_in += n
+
+        if tail is None:
+            tail = np.zeros((taps - 1,) + chunk.shape[1:], dtype=np.float32)
+
+        spectrum = np.fft.rfft(chunk.astype(np.float32), n_fft, axis=0)
+        out = np.fft.irfft(spectrum * _per_frame(kernel_fft, chunk), n_fft, axis=0)
+        out = out[:n + taps - 1]
+        out[:taps - 1] += tail
+        tail = out[n:]
+
+        ready = out[:n][skip:]
+        skip -= n - len(ready)
+        total_out += len(ready)
+        if len(ready):
+            yield np.clip(ready, -32768, 32767).astype(np.int16)
+
+    # Flush what is left of the overlap
+    if tail is None:
+        return
+    # A stream shorter than the group delay has not skipped all of it yet
+    rest = tail[skip:skip + total_in - total_out]
+    if len(rest):
+        yield np.clip(rest, -32768, 32767).astype(np.int16)
+
+
+def _shelf(kind, cutoff, sample_rate, gain):
+    """RBJ cookbook shelving biquad (slope 1) with linear gain at the shelf."""
+    A = np.sqrt(gain)
+    w0 = 2 * np.pi * cutoff / sample_rate
+    cos_w0 = np.cos(w0)
+    # alpha term for shelf slope S = 1, already multiplied by 2 * sqrt(A)
+    beta = np.sqrt(A) * np.sin(w0) * np.sqrt(2)
+
+    if kind == "low":
+        b = [A * ((A + 1) - (A - 1) * cos_w0 + beta),
+             2 * A * ((A - 1) - (A + 1) * cos_w0),
+             A * ((A + 1) - (A - 1) * cos_w0 - beta)]
+        a = [(A + 1) + (A - 1) * cos_w0 + beta,
+             -2 * ((A - 1) + (A + 1) * cos_w0),
+             (A + 1) + (A - 1) * cos_w0 - beta]
+    else:
+        b = [A * ((A + 1) + (A - 1) * cos_w0 + beta),
+             -2 * A * ((A - 1) + (A + 1) * cos_w0),
+             A * ((A + 1) + (A - 1) * cos_w0 - beta)]
+        a = [(A + 1) - (A - 1) * cos_w0 + beta,
+             2 * ((A - 1) - (A + 1) * cos_w0),
+             (A + 1) - (A - 1) * cos_w0 - beta]
+
+    return np.array(b + a) / a[0]
+
+
+@lru_cache(maxsize=32)
+def biquad_sections(sample_rate, treble, mid, bass):
+    """
+    Second-order sections for the three bands of equalize.
+
+    The mid gain is applied as a plain multiplier; a low shelf at 250 Hz and
+    a high shelf at 4 kHz move bass and treble relative to it.
+
+    Returns:
+    np.array: Read-only (2, 6) array of sections for scipy.signal.sosfilt
+    """
+    if min(treble, mid, bass) <= 0:
+        raise ValueError("Band gains must be positive for the IIR equalizer")
+
+    sos = np.stack([
+        _shelf("low", BASS_CUTOFF, sample_rate, bass / mid),
+        _shelf("high", TREBLE_CUTOFF, sample_rate, treble / mid),
+    ])
+    sos[0, :3] *= mid / 100
+
+    sos.setflags(write=False)
+    return sos
+
+
+class BiquadEqualizer:
+    """
+    Three-band equalizer built from cascaded biquads with persistent state.
+
+    Audio can be fed in blocks of any size; each call costs O(block) and
+    adds no latency, so it suits live preview and streaming export.
+    """
+
+    def __init__(self, sample_rate, treble=100, mid=100, bass=100):
+        self.sample_rate = sample_rate
+        self.set_gains(treble, mid, bass)
+        self.reset()
+
+    def set_gains(self, treble, mid, bass):
+        # Filter state is kept, so gains can change while audio is running
+        # (sosfilt wants a writable array, the cached one is read-only)
+        self.sos = biquad_sections(self.sample_rate, treble, mid, bass).copy()
+
+    def reset(self):
+        self._zi = None
+
+    def process(self, block):
+        """
+        Equalize the next block of samples.
+
+        Parameters:
+        block (np.array): Next input samples, 1-D or (frames, channels)
+
+        Returns:
+        np.array: Processed samples, same length as block; int16 for integer
+                  input, float32 otherwise
+        """
+        block = np.asarray(block)
+        if self._zi is None:
+            self._zi = np.zeros((len(self.sos), 2) + block.shape[1:])
+
+        processed, self._zi = sosfilt(self.sos, block.astype(np.float32), axis=0, zi=self._zi)
+
+        if np.issubdtype(block.dtype, np.integer):
+            processed = np.clip(processed, -32768, 32767)
+            return processed.astype(np.int16)
+        return processed.astype(np.float32)
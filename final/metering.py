@@ -0,0 +1,216 @@
+from functools import lru_cache
+
+import numpy as np
+from scipy.signal import sosfilt
+
+from resample import Resampler
+from sample_format import to_float32
+
+
+# Levels below this are reported as this value instead of -inf
+SILENCE_DB = -120.0
+
+# Gating block and hop for integrated loudness, in seconds (EBU R128)
+GATE_BLOCK = 0.4
+GATE_STEP = 0.1
+ABSOLUTE_GATE = -70.0
+RELATIVE_GATE = -10.0
+
+TRUE_PEAK_OVERSAMPLING = 4
+
+
+def to_db(value, floor=SILENCE_DB):
+    """Amplitude (1.0 is full scale) in dB, never below floor."""
+    if value <= 0:
+        return floor
+    return max(floor, float(20 * np.log10(value)))
+
+
+def _power_to_lufs(power):
+    return -0.691 + 10 * np.log10(power)
+
+
+@lru_cache(maxsize=8)
+def k_weighting(sample_rate):
+    """
+    ITU-R BS.1770 K-weighting filter for any sample rate.
+
+    A high shelf (+4 dB above about 1.7 kHz, the head model) followed by the
+    RLB high-pass at about 38 Hz, both derived for sample_rate from their
+    analog prototypes. At 48 kHz they equal the coefficients in the standard.
+
+    Returns:
+    np.array: Read-only second-order sections, shape (2, 6)
+    """
+    # High shelf
+    k = np.tan(np.pi * 1681.974450955533 / sample_rate)
+    q = 0.7071752369554196
+    vh = 10 ** (3.999843853973347 / 20)
+    vb = vh ** 0.4996667741545416
+    a0 = 1 + k / q + k * k
+    shelf = [(vh + vb * k / q + k * k) / a0, 2 * (k * k - vh) / a0, (vh - vb * k / q + k * k) / a0,
+             1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0]
+
+    # High-pass
+    k = np.tan(np.pi * 38.13547087602444 / sample_rate)
+    q = 0.5003270373238773
+    a0 = 1 + k / q + k * k
+    highpass = [1.0, -2.0, 1.0, 1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0]
+
+    sos = np.array([shelf, highpass])
+    sos.setflags(write=False)
+    return sos
+
+
+def channel_weights(channels):
+    """BS.1770 channel weights: 5.1 skips the LFE and boosts the surrounds."""
+    if channels == 6:
+        return np.array([1.0, 1.0, 1.0, 0.0, 1.41, 1.41])
+    return np.ones(channels)
+
+
+class LoudnessMeter:
+    """
+    Running peak, true-peak, RMS and loudness meter.
+
+    Feed it consecutive blocks with process(); every statistic is updated
+    in the same vectorized pass over each block and can be read at any time,
+    so a player or a render reads levels while the audio goes through it.
+    The integrated loudness keeps only one mean-square value per 100 ms, so
+    memory grows by a few bytes per second of audio.
+
+    Integrated loudness follows EBU R128: K-weighted 400 ms blocks with 75 %
+    overlap, an absolute gate at -70 LUFS and a relative gate 10 LU below
+    the mean of the blocks that pass it. True peak is measured on a 4x
+    oversampled copy of the signal.
+    """
+
+    def __init__(self, sample_rate, channels):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self._step = int(round(GATE_STEP * sample_rate))
+        self._steps_per_block = int(round(GATE_BLOCK / GATE_STEP))
+        self._weights = channel_weights(channels)
+        self._sos = np.array(k_weighting(sample_rate))
+        self._oversampler = Resampler(sample_rate, sample_rate * TRUE_PEAK_OVERSAMPLING)
+        self.reset()
+
+    def reset(self):
+        self.frames = 0
+        self.peak = 0.0
+        self.true_peak = 0.0
+        self._sum_squares = 0.0
+        self._zi = np.zeros((len(self._sos), 2, self.channels))
+        self._partial = np.zeros(0)
+        self._step_powers = []
+        self._oversampler.reset()
+
+    def process(self, block):
+        """
+        Update the levels with the next block.
+
+        Parameters:
+        block (np.array): Samples in any sample_format dtype, (frames,
+                          channels) or 1-D for mono; float data is taken
+                          as normalized to [-1, 1]
+        """
+        block = np.asarray(block)
+        if not np.issubdtype(block.dtype, np.floating):
+            block = to_float32(block)
+        block = block.reshape(len(block), self.channels)
+        if len(block) == 0:
+            return
+
+        self.frames += len(block)
+        self.peak = max(self.peak, float(np.max(np.abs(block))))
+        self._sum_squares += float(np.sum(np.square(block, dtype=np.float64)))
+
+        oversampled = self._oversampler.process(block)
+        if len(oversampled):
+            self.true_peak = max(self.true_peak, self.peak, float(np.max(np.abs(oversampled))))
+
+        weighted, self._zi = sosfilt(self._sos, block, axis=0, zi=self._zi)
+        power = np.square(weighted) @ self._weights
+
+        # Sum the K-weighted power of every complete 100 ms step
+        power = np.concatenate([self._partial, power])
+        complete = len(power) // self._step * self._step
+        if complete:
+            self._step_powers.append(power[:complete].reshape(-1, self._step).mean(axis=1))
+        self._partial = power[complete:]
+
+    def _block_powers(self):
+        if not self._step_powers:
+            return np.zeros(0)
+        # Read-only, so a reader thread can call this while another thread feeds the meter
+        steps = np.concatenate(self._step_powers)
+        if len(steps) < self._steps_per_block:
+            return np.zeros(0)
+        # Mean of every run of 4 steps is one 400 ms block, hopped by 100 ms
+        sums = np.cumsum(np.concatenate([[0.0], steps]))
+        return (sums[self._steps_per_block:] - sums[:-self._steps_per_block]) / self._steps_per_block
+
+    @property
+    def rms(self):
+        """RMS over all channels, 1.0 is a full-scale square wave."""
+        if self.frames == 0:
+            return 0.0
+        return float(np.sqrt(self._sum_squares / (self.frames * self.channels)))
+
+    @property
+    def momentary(self):
+        """Loudness of the last 400 ms in LUFS, SILENCE_DB if there is none yet."""
+        blocks = self._block_powers()
+        if len(blocks) == 0 or blocks[-1] <= 0:
+            return SILENCE_DB
+        return max(SILENCE_DB, float(_power_to_lufs(blocks[-1])))
+
+    @property
+    def integrated(self):
+        """Gated integrated loudness in LUFS, SILENCE_DB if every block is gated."""
+        blocks = self._block_powers()
+        with np.errstate(divide='ignore'):
+            loudness = _power_to_lufs(blocks)
+        blocks = blocks[loudness > ABSOLUTE_GATE]
+        if len(blocks) == 0:
+            return SILENCE_DB
+
+        relative_gate = _power_to_lufs(blocks.mean()) + RELATIVE_GATE
+        blocks = blocks[_power_to_lufs(blocks) > relative_gate]
+        return max(SILENCE_DB, float(_power_to_lufs(blocks.mean())))
+
+    def levels(self):
+        """
+        All levels in dB.
+
+        Returns:
+        dict: peak and rms in dBFS, true_peak in dBTP, momentary and
+              integrated in LUFS, all floored at SILENCE_DB
+        """
+        return {
+            'peak': to_db(self.peak),
+            'true_peak': to_db(self.true_peak),
+            'rms': to_db(self.rms),
+            'momentary': self.momentary,
+            'integrated': self.integrated,
+        }
+
+
+def measure(blocks, sample_rate, channels):
+    """
+    Meter a stream of blocks in one pass.
+
+    Returns:
+    dict: LoudnessMeter.levels() after the last block
+    """
+    meter = LoudnessMeter(sample_rate, channels)
+    for block in blocks:
+        meter.process(block)
+    return meter.levels()
+
+
+def measure_samples(samples, sample_rate, block_frames=65536):
+    """Meter a whole (frames, channels) array chunk by chunk, e.g. a memory-mapped file."""
+    channels = samples.shape[1] if samples.ndim == 2 else 1
+    blocks = (samples[start:start + block_frames] for start in range(0, len(samples), block_frames))
+    return measure(blocks, sample_rate, channels)
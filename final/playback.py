@@ -0,0 +1,281 @@
+import threading
+import time
+import wave
+
+import numpy as np
+
+from metering import LoudnessMeter
+from sample_format import to_float32
+
+
+class RingBuffer:
+    """
+    Single-producer, single-consumer ring buffer of float32 frames.
+
+    The producer only moves the write index and the consumer only moves the
+    read index, so neither side takes a lock.
+    """
+
+    def __init__(self, capacity, channels):
+        self.capacity = capacity
+        self._data = np.zeros((capacity, channels), dtype=np.float32)
+        self._read = 0
+        self._write = 0
+
+    def readable(self):
+        return self._write - self._read
+
+    def writable(self):
+        return self.capacity - self.readable()
+
+    def clear(self):
+        # Only safe while neither side is running
+        self._read = self._write = 0
+
+    def write(self, frames):
+        n = min(len(frames), self.writable())
+        start = self._write % self.capacity
+        first = min(n, self.capacity - start)
+        self._data[start:start + first] = frames[:first]
+        self._data[:n - first] = frames[first:n]
+        # Publish the frames only after they are copied in
+        self._write += n
+        return n
+
+    def read_into(self, out):
+        n = min(len(out), self.readable())
+        start = self._read % self.capacity
+        first = min(n, self.capacity - start)
+        out[:first] = self._data[start:start + first]
+        out[first:n] = self._data[:n - first]
+        self._read += n
+        return n
+
+
+class NullSink:
+    """
+    Sink that discards the audio, for running the engine headless.
+
+    A driver thread asks the engine for block_frames frames at a time, paced
+    like a sound card when realtime is True. Otherwise the sink renders
+    offline: it takes frames as fast as the engine produces them, never
+    inserts silence, and stops at the end of the audio.
+    """
+
+    def __init__(self, block_frames=512, realtime=False):
+        self.block_frames = block_frames
+        self.realtime = realtime
+        self._thread = None
+        self._running = False
+
+    def start(self, callback, sample_rate, channels):
+        self._running = True
+        self._thread = threading.Thread(target=self._drive, args=(callback, sample_rate, channels), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+
+    def _drive(self, callback, sample_rate, channels):
+        out = np.zeros((self.block_frames, channels), dtype=np.float32)
+        period = self.block_frames / sample_rate
+        next_time = time.perf_counter()
+        while self._running:
+            n = callback(out)
+            if self.realtime:
+                self.consume(out)
+                next_time += period
+                time.sleep(max(0.0, next_time - time.perf_counter()))
+            elif n:
+                self.consume(out[:n])
+            else:
+                break
+
+    def consume(self, block):
+        pass
+
+
+class WavFileSink(NullSink):
+    """Sink that writes the played audio to a 16-bit WAV file."""
+
+    def __init__(self, path, block_frames=512, realtime=False):
+        super().__init__(block_frames, realtime)
+        self.path = path
+        self._file = None
+
+    def start(self, callback, sample_rate, channels):
+        self._file = wave.open(self.path, 'wb')
+        self._file.setnchannels(channels)
+        self._file.setsampwidth(2)
+        self._file.setframerate(sample_rate)
+        super().start(callback, sample_rate, channels)
+
+    def stop(self):
+        super().stop()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def consume(self, block):
+        pcm = np.clip(block * 32768.0, -32768, 32767).astype(np.int16)
+        self._file.writeframes(pcm.tobytes())
+
+
+class SoundDeviceSink:
+    """Sound card output through the optional sounddevice package."""
+
+    def __init__(self, block_frames=512, device=None):
+        self.block_frames = block_frames
+        self.device = device
+        self._stream = None
+
+    def start(self, callback, sample_rate, channels):
+        try:
+            import sounddevice
+        except ImportError:
+            raise ImportError("Sound card playback needs the sounddevice package") from None
+
+        def stream_callback(outdata, frames, time_info, status):
+            callback(outdata)
+
+        self._stream = sounddevice.OutputStream(samplerate=sample_rate, channels=channels, dtype='float32',
+                                                blocksize=self.block_frames, device=self.device,
+                                                callback=stream_callback)
+        self._stream.start()
+
+    @property
+    def latency(self):
+        """Output latency reported by the sound card, in seconds."""
+        return self._stream.latency if self._stream is not None else 0.0
+
+    def stop(self):
+        if self._stream is not None:
+            self._stream.stop()
+            self._stream.close()
+            self._stream = None
+
+
+class PlaybackEngine:
+    """
+    Block-based playback through an effect chain.
+
+    A producer thread reads block_frames frames at a time from the samples,
+    runs them through the chain (stages keep their state between blocks,
+    so use EqualizerStage(engine="iir")) and writes them to a ring buffer.
+    The sink pulls frames from the ring buffer in its own callback. Missing
+    frames are played as silence and counted as underruns.
+
+    meter measures the processed blocks as they enter the ring buffer, so
+    the player's levels come for free; they lead the sound by `latency`.
+    """
+
+    def __init__(self, samples, sample_rate, sink, chain=None, block_frames=1024, buffer_frames=8192):
+        self.samples = samples
+        self.sample_rate = sample_rate
+        self.channels = samples.shape[1] if samples.ndim == 2 else 1
+        self.sink = sink
+        self.chain = chain
+        self.block_frames = block_frames
+
+        self.ring = RingBuffer(buffer_frames, self.channels)
+        # Offline sinks wait for the producer instead of playing silence
+        self._offline = not getattr(sink, 'realtime', True)
+        self.underruns = 0
+        self.finished = threading.Event()
+        self.meter = LoudnessMeter(sample_rate, self.channels)
+
+        self._read_pos = 0
+        self._played = 0
+        self._producing = False
+        self._producer = None
+        self._playing = False
+
+    @property
+    def position(self):
+        """Playback position in seconds."""
+        return self._played / self.sample_rate
+
+    @property
+    def latency(self):
+        """Time from a block leaving the chain to being heard, in seconds."""
+        buffered = self.ring.readable() + getattr(self.sink, 'block_frames', 0)
+        return buffered / self.sample_rate + getattr(self.sink, 'latency', 0.0)
+
+    @property
+    def playing(self):
+        return self._playing
+
+    def play(self):
+        if self._playing:
+            return
+        self.finished.clear()
+        self._playing = True
+        self._producing = True
+        self._producer = threading.Thread(target=self._produce, daemon=True)
+        self._producer.start()
+        try:
+            self.sink.start(self._callback, self.sample_rate, self.channels)
+        except Exception:
+            self._playing = False
+            self._producing = False
+            self._producer.join()
+            self._producer = None
+            raise
+
+    def stop(self):
+        if not self._playing:
+            return
+        self._playing = False
+        self.sink.stop()
+        self._producing = False
+        self._producer.join()
+        self._producer = None
+
+    def seek(self, seconds):
+        was_playing = self._playing
+        self.stop()
+        frame = int(np.clip(seconds * self.sample_rate, 0, len(self.samples)))
+        self._read_pos = self._played = frame
+        self.ring.clear()
+        if self.chain is not None:
+            self.chain.reset()
+        if was_playing:
+            self.play()
+
+    def _produce(self):
+        # Keep the ring buffer topped up; wait about a quarter block when it is full
+        idle = self.block_frames / self.sample_rate / 4
+        while self._producing and self._read_pos < len(self.samples):
+            if self.ring.writable() < self.block_frames:
+                time.sleep(idle)
+                continue
+            block = self.samples[self._read_pos:self._read_pos + self.block_frames]
+            buffer = to_float32(block.reshape(len(block), self.channels))
+            if self.chain is not None:
+                buffer = self.chain.process(buffer, self.sample_rate)
+            self.meter.process(buffer)
+            self.ring.write(buffer)
+            self._read_pos += len(block)
+
+    def _producer_done(self):
+        return self._read_pos >= len(self.samples) or not self._producing
+
+    def _callback(self, out):
+        """Fill out from the ring buffer; returns the number of frames that are audio."""
+        if self._offline:
+            idle = self.block_frames / self.sample_rate / 4
+            while self.ring.readable() < len(out) and not self._producer_done():
+                time.sleep(idle)
+
+        n = self.ring.read_into(out)
+        if n < len(out):
+            out[n:] = 0
+            if self._read_pos < len(self.samples):
+                self.underruns += 1
+            elif self.ring.readable() == 0:
+                self.finished.set()
+        self._played += n
+        return n
@@ -0,0 +1,154 @@
+import threading
+
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+from chain import RenderCancelled
+
+
+class _JobSignals(QObject):
+    progress = pyqtSignal(int, int)
+    finished = pyqtSignal(int, object)
+    failed = pyqtSignal(int, str)
+    done = pyqtSignal(int)
+
+
+class _RenderJob(QRunnable):
+
+    def __init__(self, job_id, chain, samples, sample_rate, cache, source_key):
+        super().__init__()
+        # Python owns the job, Qt must not delete it after run()
+        self.setAutoDelete(False)
+        self.job_id = job_id
+        self.chain = chain
+        self.samples = samples
+        self.sample_rate = sample_rate
+        self.cache = cache
+        self.source_key = source_key
+        self.signals = _JobSignals()
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def _progress(self, done, total):
+        self.signals.progress.emit(self.job_id, int(100 * done / max(total, 1)))
+
+    def run(self):
+        try:
+            output = self.chain.render_cached(self.samples, self.sample_rate, self.cache,
+                                              source_key=self.source_key, progress=self._progress,
+                                              cancelled=self._cancel.is_set)
+        except RenderCancelled:
+            pass
+        except Exception as e:
+            self.signals.failed.emit(self.job_id, str(e))
+        else:
+            self.signals.finished.emit(self.job_id, output)
+        finally:
+            self.signals.done.emit(self.job_id)
+
+
+class _Task(QRunnable):
+
+    def __init__(self, task_id, function):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.task_id = task_id
+        self.function = function
+        self.signals = _JobSignals()
+
+    def run(self):
+        try:
+            result = self.function()
+        except Exception as e:
+            self.signals.failed.emit(self.task_id, str(e))
+        else:
+            self.signals.finished.emit(self.task_id, result)
+        finally:
+            self.signals.done.emit(self.task_id)
+
+
+class RenderWorker(QObject):
+    """
+    Renders effect chains on a background thread.
+
+    Only the newest render matters: starting one cancels the render already
+    running, and signals from cancelled or outdated renders are dropped.
+    Cancellation takes effect between chain stages.
+    """
+
+    progress = pyqtSignal(int)
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        # One render thread, so renders never share the stage cache concurrently
+        self._pool = QThreadPool(self)
+        self._pool.setMaxThreadCount(1)
+        self._job = None
+        self._next_id = 0
+        # Keeps every started job alive until its thread is done with it
+        self._jobs = {}
+        # Analysis tasks get their own thread, so they neither wait for nor delay renders
+        self._task_pool = QThreadPool(self)
+        self._task_pool.setMaxThreadCount(1)
+
+    def is_running(self):
+        return self._job is not None
+
+    def start(self, chain, samples, sample_rate, cache, source_key=None):
+        self.cancel()
+
+        self._next_id += 1
+        job = _RenderJob(self._next_id, chain, samples, sample_rate, cache, source_key)
+        job.signals.progress.connect(self._on_progress)
+        job.signals.finished.connect(self._on_finished)
+        job.signals.failed.connect(self._on_failed)
+        job.signals.done.connect(self._on_done)
+
+        self._job = job
+        self._jobs[job.job_id] = job
+        self._pool.start(job)
+
+    def run_task(self, function, finished):
+        """
+        Run function() in the background and pass its result to finished on
+        the GUI thread, e.g. to measure a file that was just opened. Tasks
+        are not cancelled; a failure is printed.
+        """
+        self._next_id += 1
+        task = _Task(self._next_id, function)
+        task.signals.finished.connect(lambda task_id, result: finished(result))
+        task.signals.failed.connect(lambda task_id, message: print(f"Background task error: {message}"))
+        task.signals.done.connect(self._on_done)
+
+        self._jobs[task.task_id] = task
+        self._task_pool.start(task)
+
+    def cancel(self):
+        if self._job is not None:
+            self._job.cancel()
+            self._job = None
+            self.cancelled.emit()
+
+    def _is_current(self, job_id):
+        return self._job is not None and self._job.job_id == job_id
+
+    def _on_progress(self, job_id, percent):
+        if self._is_current(job_id):
+            self.progress.emit(percent)
+
+    def _on_finished(self, job_id, output):
+        if self._is_current(job_id):
+            self._job = None
+            self.finished.emit(output)
+
+    def _on_failed(self, job_id, message):
+        if self._is_current(job_id):
+            self._job = None
+            self.failed.emit(message)
+
+    def _on_done(self, job_id):
+        self._jobs.pop(job_id, None)
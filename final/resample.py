@@ -0,0 +1,193 @@
+from functools import lru_cache
+from math import gcd
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.signal import firwin, resample_poly
+
+
+def resample_ratio(source_rate, target_rate):
+    """Reduced (up, down) factors that convert source_rate to target_rate."""
+    source_rate, target_rate = int(source_rate), int(target_rate)
+    common = gcd(source_rate, target_rate)
+    return target_rate // common, source_rate // common
+
+
+@lru_cache(maxsize=16)
+def lowpass_filter(up, down, half_width=10, beta=5.0):
+    """
+    Anti-aliasing low-pass filter for resampling by up / down.
+
+    Kaiser-windowed sinc with the cutoff at the lower of the two Nyquist
+    frequencies and unit gain, the same design scipy's resample_poly uses by
+    default, so the output matches it.
+
+    Returns:
+    np.array: Read-only float64 filter of 2 * half_width * max(up, down) + 1 taps
+    """
+    half_len = half_width * max(up, down)
+    h = firwin(2 * half_len + 1, 1.0 / max(up, down), window=('kaiser', beta))
+
+    h.setflags(write=False)
+    return h
+
+
+@lru_cache(maxsize=16)
+def polyphase_filter(up, down):
+    """
+    lowpass_filter scaled by up for the zero-stuffed input, with zeros
+    prepended so its delay is a whole number of output samples.
+
+    Returns:
+    tuple: (read-only float64 filter, delay in output samples)
+    """
+    h = lowpass_filter(up, down)
+    half_len = (len(h) - 1) // 2
+    pre_pad = -half_len % down
+    h = np.concatenate([np.zeros(pre_pad), h * up])
+
+    h.setflags(write=False)
+    return h, (half_len + pre_pad) // down
+
+
+@lru_cache(maxsize=16)
+def polyphase_matrix(up, down):
+    """
+    polyphase_filter split into its up phases, taps in reverse order.
+
+    Row p holds the taps that produce outputs at phase p of the upsampled
+    grid, so one output is one dot product with the latest input samples.
+
+    Returns:
+    np.array: Read-only float32 array of shape (up, taps per phase)
+    """
+    h, _ = polyphase_filter(up, down)
+    taps = -(-len(h) // up)
+    phases = np.pad(h, (0, taps * up - len(h))).reshape(taps, up).T
+    matrix = np.ascontiguousarray(phases[:, ::-1], dtype=np.float32)
+
+    matrix.setflags(write=False)
+    return matrix
+
+
+def resample(samples, source_rate, target_rate):
+    """
+    Resample a whole signal.
+
+    Parameters:
+    samples (np.array): float samples, 1-D or (frames, channels)
+    source_rate (int): Sample rate of samples in Hz
+    target_rate (int): Wanted sample rate in Hz
+
+    Returns:
+    np.array: float32 samples at target_rate, ceil(frames * up / down) long,
+              equal to scipy.signal.resample_poly up to float32 rounding
+    """
+    samples = np.asarray(samples, dtype=np.float32)
+    up, down = resample_ratio(source_rate, target_rate)
+    if up == down:
+        return samples.copy()
+    # Passing the cached filter skips the filter design on every call
+    return resample_poly(samples, up, down, axis=0, window=lowpass_filter(up, down)).astype(np.float32)
+
+
+class Resampler:
+    """
+    Streaming polyphase resampler.
+
+    The filter is designed once per (up, down) ratio and shared by all
+    resamplers. Blocks of any size can be passed to process(); only the
+    last taps - 1 input frames are kept between calls, and each block is
+    converted with one vectorized gather over a strided view of them.
+    Output lags the input by `latency` output frames, see resample_stream
+    for a delay-compensated generator.
+    """
+
+    def __init__(self, source_rate, target_rate):
+        self.source_rate = source_rate
+        self.target_rate = target_rate
+        self.up, self.down = resample_ratio(source_rate, target_rate)
+        self.latency = polyphase_filter(self.up, self.down)[1] if self.up != self.down else 0
+        self._matrix = polyphase_matrix(self.up, self.down) if self.up != self.down else None
+        self.reset()
+
+    def reset(self):
+        self._history = None
+        self._consumed = 0
+        self._produced = 0
+
+    def process(self, block):
+        """
+        Resample the next block of float samples.
+
+        Parameters:
+        block (np.array): float samples, 1-D or (frames, channels)
+
+        Returns:
+        np.array: float32 output frames that are complete so far
+        """
+        block = np.asarray(block, dtype=np.float32)
+        if self._matrix is None:
+            return block.copy()
+
+        taps = self._matrix.shape[1]
+        if self._history is None:
+            self._history = np.zeros((taps - 1,) + block.shape[1:], dtype=np.float32)
+        extended = np.concatenate([self._history, block])
+        available = self._consumed + len(block)
+
+        last = -(-available * self.up // self.down)
+        if self.down == 1:
+            # Integer upsampling: every input frame yields all up phases, one matrix product
+            windows = sliding_window_view(extended, taps, axis=0)[:len(block)]
+            out = np.moveaxis(windows @ self._matrix.T, -1, 1).reshape((last - self._produced,) + block.shape[1:])
+        else:
+            # Output m is computed from input frame (m * down) // up and the taps - 1 before it
+            m = np.arange(self._produced, last, dtype=np.int64)
+            position = m * self.down
+            frames = position // self.up - self._consumed
+            phases = position % self.up
+
+            windows = sliding_window_view(extended, taps, axis=0)[frames]
+            out = np.einsum('mt,m...t->m...', self._matrix[phases], windows).astype(np.float32)
+
+        self._history = extended[len(extended) - (taps - 1):]
+        self._consumed = available
+        self._produced = last
+        return out
+
+
+def resample_stream(blocks, source_rate, target_rate):
+    """
+    Resample a stream of float blocks, compensating the filter delay.
+
+    Yields float32 blocks that together are exactly what resample returns
+    for the concatenated input.
+    """
+    resampler = Resampler(source_rate, target_rate)
+    skip = resampler.latency
+    frames = 0
+    shape = None
+
+    for block in blocks:
+        block = np.asarray(block, dtype=np.float32)
+        frames += len(block)
+        shape = block.shape[1:]
+        out = resampler.process(block)
+        if skip:
+            dropped = min(skip, len(out))
+            out = out[dropped:]
+            skip -= dropped
+        if len(out):
+            yield out
+
+    if shape is None or resampler._matrix is None:
+        return
+
+    # Push zeros through until every output frame of the signal has left the filter
+    total = -(-frames * resampler.up // resampler.down) + resampler.latency
+    needed = total - resampler._produced
+    tail_frames = -(-total * resampler.down // resampler.up) - frames + 1
+    out = resampler.process(np.zeros((tail_frames,) + shape, dtype=np.float32))[skip:needed]
+    if len(out):
+        yield out
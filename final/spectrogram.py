@@ -0,0 +1,130 @@
+from collections import OrderedDict
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from sample_format import to_float32
+
+
+class Spectrogram:
+    """
+    Short-time spectra of a signal, computed in cached tiles.
+
+    A tile is TILE_COLUMNS consecutive STFT columns at one zoom level. Level 0
+    uses a hop of n_fft / 2 and every next level doubles the hop, so a view
+    of any length needs a bounded number of columns. Each tile is computed
+    as one vectorized batch over a strided view of its frames, and only the
+    tiles covering the visible time range are computed.
+    """
+
+    TILE_COLUMNS = 256
+
+    def __init__(self, samples, sample_rate, n_fft=1024, max_tiles=256):
+        self.samples = samples
+        self.sample_rate = sample_rate
+        self.n_fft = n_fft
+        self.max_tiles = max_tiles
+        self.window = np.hanning(n_fft).astype(np.float32)
+        self._tiles = OrderedDict()
+
+    @property
+    def frames(self):
+        return len(self.samples)
+
+    @property
+    def max_frequency(self):
+        return self.sample_rate / 2
+
+    def hop(self, level):
+        return (self.n_fft // 2) << level
+
+    def level_for(self, frame_span, max_columns):
+        """Finest zoom level that draws frame_span frames in at most max_columns columns."""
+        level = 0
+        while frame_span / self.hop(level) > max_columns and self.hop(level) < self.frames:
+            level += 1
+        return level
+
+    def _windows(self, starts):
+        """Mono windows of n_fft frames starting at the given frames, zero padded past the end."""
+        first = starts[0]
+        hop = starts[1] - starts[0] if len(starts) > 1 else self.n_fft
+        if hop <= self.n_fft:
+            # Overlapping windows: one contiguous read and a strided view over it
+            stop = starts[-1] + self.n_fft
+            chunk = self._mono(first, stop)
+            return sliding_window_view(chunk, self.n_fft)[::hop]
+
+        # Sparse windows at coarse zoom: read only the frames that are used
+        return np.stack([self._mono(start, start + self.n_fft) for start in starts])
+
+    def _mono(self, start, stop):
+        chunk = to_float32(self.samples[start:min(stop, self.frames)])
+        if chunk.ndim == 2:
+            chunk = chunk.mean(axis=1)
+        if len(chunk) < stop - start:
+            chunk = np.pad(chunk, (0, stop - start - len(chunk)))
+        return chunk
+
+    def tile(self, level, index):
+        """
+        Magnitudes in dB of one tile.
+
+        Returns:
+        np.array: (columns, n_fft // 2 + 1) float32, columns past the end of
+                  the signal are left out
+        """
+        key = (level, index)
+        tile = self._tiles.get(key)
+        if tile is not None:
+            self._tiles.move_to_end(key)
+            return tile
+
+        hop = self.hop(level)
+        starts = np.arange(self.TILE_COLUMNS) * hop + index * self.TILE_COLUMNS * hop
+        starts = starts[starts < self.frames]
+
+        if len(starts) == 0:
+            tile = np.zeros((0, self.n_fft // 2 + 1), dtype=np.float32)
+        else:
+            windows = self._windows(starts) * self.window
+            magnitudes = np.abs(np.fft.rfft(windows, axis=1))
+            tile = (20 * np.log10(magnitudes + 1e-9)).astype(np.float32)
+
+        self._tiles[key] = tile
+        while len(self._tiles) > self.max_tiles:
+            self._tiles.popitem(last=False)
+        return tile
+
+    def cached_tiles(self, min_level=0):
+        """Tiles computed so far at min_level or coarser, as {(level, index): tile}."""
+        return {key: tile for key, tile in self._tiles.items() if key[0] >= min_level}
+
+    def add_tiles(self, tiles):
+        """Add precomputed tiles, e.g. loaded from a cache."""
+        for key, tile in tiles.items():
+            self._tiles[key] = tile
+        while len(self._tiles) > self.max_tiles:
+            self._tiles.popitem(last=False)
+
+    def image(self, start, stop, max_columns=2000):
+        """
+        Spectrogram image for frames start..stop.
+
+        Returns:
+        tuple: (image of shape (columns, bins), first frame, last frame)
+               where the frames are the time span the image covers
+        """
+        start = int(np.clip(start, 0, self.frames))
+        stop = int(np.clip(stop, start + 1, max(self.frames, 1)))
+
+        level = self.level_for(stop - start, max_columns)
+        hop = self.hop(level)
+        tile_frames = self.TILE_COLUMNS * hop
+        first_tile = start // tile_frames
+        last_tile = (stop - 1) // tile_frames
+
+        tiles = [self.tile(level, i) for i in range(first_tile, last_tile + 1)]
+        image = np.concatenate(tiles)
+        first_frame = first_tile * tile_frames
+        return image, first_frame, first_frame + len(image) * hop
@@ -0,0 +1,86 @@
+import os
+import struct
+from collections import namedtuple
+
+import numpy as np
+
+from sample_format import sample_dtype
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+WavInfo = namedtuple('WavInfo', 'sample_rate channels sample_width format_tag frames data_offset')
+
+
+def read_wav_header(path):
+    """
+    Parse the RIFF header of a WAV file without reading the samples.
+
+    Returns:
+    WavInfo: Stream parameters and the byte offset of the data chunk
+    """
+    file_size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        riff, _, wave_id = struct.unpack('<4sI4s', f.read(12))
+        if riff != b'RIFF' or wave_id != b'WAVE':
+            raise ValueError(f"Not a RIFF/WAVE file: {path}")
+
+        fmt = None
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                raise ValueError(f"No data chunk in {path}")
+            chunk_id, chunk_size = struct.unpack('<4sI', header)
+
+            if chunk_id == b'fmt ':
+                body = f.read(chunk_size)
+                format_tag, channels, sample_rate, _, block_align, bits = struct.unpack('<HHIIHH', body[:16])
+                if format_tag == WAVE_FORMAT_EXTENSIBLE and len(body) >= 26:
+                    # The real format is the first two bytes of the sub-format GUID
+                    format_tag = struct.unpack('<H', body[24:26])[0]
+                fmt = (format_tag, channels, sample_rate, block_align)
+            elif chunk_id == b'data':
+                if fmt is None:
+                    raise ValueError(f"data chunk before fmt chunk in {path}")
+                data_offset = f.tell()
+                # Streamed or truncated files may claim more data than there is
+                data_size = min(chunk_size, file_size - data_offset)
+                break
+            else:
+                f.seek(chunk_size, os.SEEK_CUR)
+
+            # Chunks are word aligned
+            if chunk_size % 2:
+                f.seek(1, os.SEEK_CUR)
+
+    format_tag, channels, sample_rate, block_align = fmt
+    return WavInfo(sample_rate, channels, block_align // channels, format_tag,
+                   data_size // block_align, data_offset)
+
+
+def open_wav_memmap(path):
+    """
+    Open a WAV file as a read-only memory-mapped (frames, channels) array.
+
+    Nothing is read up front: pages of the data chunk are loaded by the OS
+    only when the samples are touched. 24-bit files map to packed
+    sample_format.INT24 items, see sample_format.unpack_int24.
+
+    Returns:
+    tuple: (np.memmap of shape (frames, channels), WavInfo)
+    """
+    info = read_wav_header(path)
+    if info.format_tag not in (WAVE_FORMAT_PCM, WAVE_FORMAT_IEEE_FLOAT):
+        raise ValueError(f"Unsupported WAV format {info.format_tag:#x}: {path}")
+    try:
+        dtype = sample_dtype(info.sample_width, info.format_tag == WAVE_FORMAT_IEEE_FLOAT)
+    except ValueError as e:
+        raise ValueError(f"{e}: {path}") from None
+
+    if info.frames == 0:
+        return np.zeros((0, info.channels), dtype=dtype), info
+
+    samples = np.memmap(path, dtype=dtype, mode='r', offset=info.data_offset,
+                        shape=(info.frames, info.channels))
+    return samples, info
@@ -0,0 +1,223 @@
+import weakref
+
+import numpy as np
+
+
+class PeakPyramid:
+    """
+    Min/max peak pyramid of a signal for drawing the A(t) plot.
+
+    Level 0 holds the minimum and maximum of every `base` frames (over all
+    channels), each next level combines `factor` buckets of the previous one.
+    view() picks the coarsest level that still gives enough detail, so any
+    visible range is drawn with at most a few thousand points.
+    """
+
+    def __init__(self, samples, base=64, factor=4):
+        self.samples = samples
+        self.frames = len(samples)
+        self.base = base
+        self.factor = factor
+        self.levels = []
+
+        mins, maxs = self._reduce(samples, samples, base)
+        bucket = base
+        while True:
+            self.levels.append((bucket, mins, maxs))
+            if len(mins) <= 1:
+                break
+            mins, maxs = self._reduce(mins, maxs, factor)
+            bucket *= factor
+
+    @classmethod
+    def from_levels(cls, samples, levels, base=64, factor=4):
+        """Pyramid with already computed levels, e.g. loaded from a cache."""
+        pyramid = cls.__new__(cls)
+        pyramid.samples = samples
+        pyramid.frames = len(samples)
+        pyramid.base = base
+        pyramid.factor = factor
+        pyramid.levels = list(levels)
+        return pyramid
+
+    # Rows reduced at a time, so building the pyramid of a memory-mapped file never copies all of it
+    REDUCE_CHUNK = 1 << 20
+
+    @classmethod
+    def _reduce(cls, mins, maxs, size):
+        """Min and max over groups of `size` rows, the last group may be partial."""
+        whole = len(mins) // size
+        n_groups = -(-len(mins) // size)
+        reduced_mins = np.empty(n_groups, dtype=mins.dtype)
+        reduced_maxs = np.empty(n_groups, dtype=maxs.dtype)
+
+        # Whole groups: reshaped views of one chunk at a time
+        step = max(1, cls.REDUCE_CHUNK // size)
+        for first in range(0, whole, step):
+            last = min(first + step, whole)
+            rows = slice(first * size, last * size)
+            reduced_mins[first:last] = mins[rows].reshape(last - first, -1).min(axis=1)
+            reduced_maxs[first:last] = maxs[rows].reshape(last - first, -1).max(axis=1)
+
+        # The partial group at the end on its own
+        if n_groups > whole:
+            reduced_mins[-1] = mins[whole * size:].min()
+            reduced_maxs[-1] = maxs[whole * size:].max()
+        return reduced_mins, reduced_maxs
+
+    def view(self, start, stop, max_points=4000):
+        """
+        Points to draw for frames start..stop.
+
+        Returns:
+        tuple: (frame positions, values) as float arrays. Zoomed in enough,
+               these are the samples themselves (channel mean), otherwise
+               interleaved min/max pairs of one pyramid level.
+        """
+        start = int(np.clip(start, 0, self.frames))
+        stop = int(np.clip(stop, start, self.frames))
+
+        if stop - start <= max_points:
+            values = self.samples[start:stop]
+            if values.ndim == 2:
+                values = values.mean(axis=1)
+            return np.arange(start, stop, dtype=np.float64), values.astype(np.float64)
+
+        for bucket, mins, maxs in self.levels:
+            if (stop - start) / bucket * 2 <= max_points:
+                break
+
+        first = start // bucket
+        last = -(-stop // bucket)
+        positions = np.repeat(np.arange(first, last) * bucket, 2).astype(np.float64)
+        values = np.empty(len(positions))
+        values[0::2] = mins[first:last]
+        values[1::2] = maxs[first:last]
+        return positions, values
+
+    def peaks(self, start, stop, bucket):
+        """
+        Interleaved min/max pairs of exactly frames start..stop on a grid of
+        `bucket` frames, the bucket size of one of the levels.
+
+        Whole buckets come from that level, the partial ones at either end
+        from extremes().
+
+        Returns:
+        tuple: (frame positions, values) as float arrays
+        """
+        whole_start = -(-start // bucket) * bucket
+        whole_stop = stop // bucket * bucket
+        if whole_start >= whole_stop:
+            # No whole bucket inside: one pair for the whole range
+            whole_start = whole_stop = stop
+
+        parts = []
+        if start < whole_start:
+            parts.append(self._extremes(start, whole_start))
+        if whole_start < whole_stop:
+            _, mins, maxs = next(level for level in self.levels if level[0] == bucket)
+            first, last = whole_start // bucket, whole_stop // bucket
+            parts.append((np.arange(first, last) * bucket, mins[first:last], maxs[first:last]))
+        if whole_stop < stop:
+            parts.append(self._extremes(whole_stop, stop))
+        if not parts:
+            return np.zeros(0), np.zeros(0)
+
+        positions = np.repeat(np.concatenate([part[0] for part in parts]), 2).astype(np.float64)
+        values = np.empty(len(positions))
+        values[0::2] = np.concatenate([part[1] for part in parts])
+        values[1::2] = np.concatenate([part[2] for part in parts])
+        return positions, values
+
+    def _extremes(self, start, stop):
+        low, high = self.extremes(start, stop)
+        return np.array([start]), np.array([low]), np.array([high])
+
+    def extremes(self, start, stop):
+        """
+        Min and max of frames start..stop (start < stop), read from the
+        coarsest level with a whole bucket inside the range; only the ends
+        shorter than a base bucket read samples, so the cost does not grow
+        with the length of the range.
+        """
+        for bucket, mins, maxs in reversed(self.levels):
+            first = -(-start // bucket)
+            last = stop // bucket
+            if first < last:
+                break
+        else:
+            chunk = self.samples[start:stop]
+            return chunk.min(), chunk.max()
+
+        low = mins[first:last].min()
+        high = maxs[first:last].max()
+        for a, b in ((start, first * bucket), (last * bucket, stop)):
+            if b > a:
+                edge_low, edge_high = self.extremes(a, b)
+                low = min(low, edge_low)
+                high = max(high, edge_high)
+        return low, high
+
+
+class PyramidCache:
+    """PeakPyramid of each block of an edit buffer, built on first use and dropped with its block."""
+
+    def __init__(self):
+        self._pyramids = {}
+
+    def get(self, block):
+        entry = self._pyramids.get(id(block))
+        if entry is None or entry[0]() is not block:
+            # Forget blocks that are gone, their ids may be reused
+            self._pyramids = {key: value for key, value in self._pyramids.items() if value[0]() is not None}
+            entry = (weakref.ref(block), PeakPyramid(block))
+            self._pyramids[id(block)] = entry
+        return entry[1]
+
+
+class PieceOverview:
+    """
+    A(t) overview of an edit.Snapshot, drawn from the pyramids of its blocks.
+
+    Edits only rearrange pieces of immutable blocks, so the pyramid of every
+    block stays valid: view() maps the visible pieces onto their blocks'
+    pyramids and only new blocks (e.g. the output of an effect) need a new
+    pyramid. Nothing proportional to the file length is done per edit.
+    """
+
+    def __init__(self, snapshot, pyramid_for, base=64, factor=4):
+        """
+        Parameters:
+        snapshot (edit.Snapshot): Edited audio
+        pyramid_for (callable): Returns the PeakPyramid of a piece's block
+        """
+        self.samples = snapshot
+        self.frames = snapshot.frames
+        self.pyramid_for = pyramid_for
+        self.base = base
+        self.factor = factor
+
+    def view(self, start, stop, max_points=4000):
+        """Same as PeakPyramid.view, for the edited audio."""
+        start = int(np.clip(start, 0, self.frames))
+        stop = int(np.clip(stop, start, self.frames))
+
+        if stop - start <= max_points:
+            values = self.samples[start:stop]
+            if values.ndim == 2:
+                values = values.mean(axis=1)
+            return np.arange(start, stop, dtype=np.float64), values.astype(np.float64)
+
+        bucket = self.base
+        while (stop - start) / bucket * 2 > max_points:
+            bucket *= self.factor
+
+        positions, values = [], []
+        for position, piece in self.samples.pieces_between(start, stop):
+            piece_positions, piece_values = self.pyramid_for(piece.block).peaks(piece.start, piece.stop, bucket)
+            positions.append(piece_positions + (position - piece.start))
+            values.append(piece_values)
+        if not positions:
+            return np.zeros(0), np.zeros(0)
+        return np.concatenate(positions), np.concatenate(values)